@@ -1,18 +1,26 @@
 """Generate a bunch of spectrograms of ripple sounds.
 
 """
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 
-from scipy.interpolate import interp1d
 from scipy.signal import spectrogram
 
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+from stimulus_cache import StimulusCache
+from trajectories import Trajectory
+
 
 a0 = 1e-5  # reference amplitude
 sr = 44100  # sample rate
 
 
-def ripple_sound(dur, n, omega, w, delta, phi, f0, fm1, rand_gamma=True, l=60):
+def ripple_sound(
+    dur, n, omega, w, delta, phi, f0, fm1, rand_gamma=True, l=60, osc="sin", rng=None
+):
     """Synthesises a ripple sound.
 
     Args:
@@ -32,6 +40,12 @@ def ripple_sound(dur, n, omega, w, delta, phi, f0, fm1, rand_gamma=True, l=60):
             sinusoids prior to scaling. Defaults to `False`.
         l (:obj:`float`, optional): Level in dB of the sound, assuming a pure tone with
             peak amplitude `a0` is 0 dB SPL.
+        osc (:obj:`str`, optional): Oscillator backend. Either "sin", which evaluates
+            `np.sin` for every sinusoid and sample, or "phasor", which advances
+            complex phasors by multiplication (see `phasors`).
+        rng (:obj:`np.random.Generator`, optional): Source of the random starting
+            phases and amplitudes of the sinusoids. Defaults to the global `np.random`
+            state.
 
     Returns:
         y (np.array): The waveform.
@@ -45,8 +59,13 @@ def ripple_sound(dur, n, omega, w, delta, phi, f0, fm1, rand_gamma=True, l=60):
     t = np.linspace(0, dur, int(m)).reshape(shapea)
     i = np.arange(n).reshape(shapeb)
     f = f0 * (fm1 / f0) ** (i / (n - 1))
-    sphi = 2 * np.pi * np.random.random(shapeb)
-    s = np.sin(2 * np.pi * f * t + sphi)
+    rng = np.random if rng is None else rng
+    sphi = 2 * np.pi * rng.random(shapeb)
+    if osc == "sin":
+        s = np.sin(2 * np.pi * f * t + sphi)
+    else:
+        dt = t[0, 1] - t[0, 0]
+        s = phasors(sphi[:, 0], 2 * np.pi * f[:, 0] * dt, m).imag
 
     # create envelope
     if hasattr(w, "__iter__"):
@@ -57,16 +76,28 @@ def ripple_sound(dur, n, omega, w, delta, phi, f0, fm1, rand_gamma=True, l=60):
 
     if hasattr(omega, "__iter__"):
         assert len(omega) == m, "w vector has incorrect length"
+        static = False
     else:
         omega = np.tile(omega, m)
+        static = True
     omega = omega.reshape(shapea)
     x = np.log2(f / f0)
-    a = 1 + delta * np.sin(2 * np.pi * (wprime + omega * x) + phi)
+    if osc == "sin":
+        a = 1 + delta * np.sin(2 * np.pi * (wprime + omega * x) + phi)
+    else:
+        # x is evenly spaced, so the envelope phase factorizes into a phasor over time
+        # and one that advances over sinusoids
+        u = np.exp(1j * (2 * np.pi * wprime + phi))
+        if static:
+            v = np.exp(2j * np.pi * omega[0, 0] * x)
+        else:
+            v = phasors(0, 2 * np.pi * omega[0] * x[1, 0], n, axis=0)
+        a = 1 + delta * (u.imag * v.real + u.real * v.imag)
 
     # gamma is not traditional; it was added to make sounds from complexity level 1
     # sound a bit different from one another
     if rand_gamma:
-        gamma = np.random.random(shapeb)
+        gamma = rng.random(shapeb)
     else:
         gamma = 1
 
@@ -78,37 +109,74 @@ def ripple_sound(dur, n, omega, w, delta, phi, f0, fm1, rand_gamma=True, l=60):
     return y, a
 
 
-def random_walk(points, dur):
+def phasors(theta0, dtheta, k, axis=1):
+    """Returns unit phasors with linearly advancing phases.
+
+    Computes `np.exp(1j * (theta0 + dtheta * np.arange(k)))` by repeatedly multiplying
+    the block computed so far by the rotation over its own length, so that every
+    phasor is at most `log2(k)` multiplications away from an exactly evaluated one.
+
+    Args:
+        theta0 (np.array): Starting phases in radians.
+        dtheta (np.array): Phase advance per step in radians.
+        k (int): Number of steps.
+        axis (:obj:`int`, optional): Axis of the output along which the phases
+            advance.
+
+    Returns:
+        z (np.array): Complex array with shape `(len(theta0), k)`, or
+            `(k, len(theta0))` if `axis` is 0.
+
+    """
+    theta0, dtheta = np.broadcast_arrays(theta0, dtheta)
+    theta0, dtheta = np.expand_dims(theta0, axis), np.expand_dims(dtheta, axis)
+    shape = list(theta0.shape)
+    shape[axis] = k
+    z = np.empty(shape, dtype=complex)
+    pre = (slice(None),) * axis  # indexes the steps along `axis`
+    z[pre + (slice(0, 1),)] = np.exp(1j * theta0)
+    j = 1
+    while j < k:
+        h = min(j, k - j)
+        z[pre + (slice(j, j + h),)] = z[pre + (slice(0, h),)] * np.exp(1j * dtheta * j)
+        j += h
+    return z
+
+
+def random_walk(points, dur, control_rate=None):
     """Return a smooth random walk.
 
     Creates a smooth vector of length `duration` in which the values within `points`
     are visited. `Points` are spaced equally along the vector.
 
     Args:
-        points (:obj:`array`-like): Points to visit.
+        points (:obj:`array`-like): Points to visit. Pass a 2-D array to create
+            several walks at once, one per row.
+        dur (float): Duration in s.
+        control_rate (:obj:`float`, optional): Evaluate the spline at this rate in Hz
+            and interpolate linearly in between, rather than at every sample.
 
+    Returns:
+        y (numpy.array): Values of the random walk, one per sample.
 
     """
-    f = interp1d(np.linspace(0, dur, len(points)), points, "cubic")
-    return f(np.linspace(0, dur, dur * sr))
+    return Trajectory(points, dur)(sr, control_rate)
 
 
-def make_figs(seed, dpi, fontsize, labels, aspect, ticks, ext, cmap):
-    """Create and plot some ripple sounds; saving the figs to the current directory.
+def make_sounds(seed, cache=None):
+    """Synthesize two ripple sounds from each of four categories.
 
     Args:
         seed (int): Seed the random-number generator. Choose a different value to create
             different waveforms.
-        dpi (int): Resolution of figures.
-        fontsize (int): For axis and tick labels.
-        labels (bool): Add the category number to the top of the figure.
-        aspect (float): Makes the figure longer by this factor.
-        ticks (bool): Show ticks on axes.
-        ext (str): File extension. For vector graphics, choose "svg". For raster, choose
-            "png". Either way, the spectrogram itself is a raster; this just effects the
-            axes.
-        cmap (str): Name of the colormap. Default is "viridis". Other good options are
-            "cividis", "plasma" and "inferno". Don't use "jet"!
+        cache (:obj:`StimulusCache`, optional): Cache of previously synthesized
+            sounds. If omitted, the sounds are synthesized without caching.
+
+    Returns:
+        ys (np.array): Waveforms with shape `(8, m)`.
+        cats (np.array): Category and exemplar number of each waveform.
+        f0 (float): Frequency of the lowest sinusoid in Hz.
+        fm1 (float): Frequency of the highest sinusoid in Hz.
 
     """
     # don't change these!
@@ -121,22 +189,14 @@ def make_figs(seed, dpi, fontsize, labels, aspect, ticks, ext, cmap):
     args = (phi, f0, fm1, ran_gamma)
 
     np.random.seed(seed)
-
-    # set up the figures
-    from matplotlib import rcParams
-
-    figsize = rcParams["figure.figsize"]
-    rcParams["figure.figsize"] = [figsize[0], int(figsize[1] * aspect)]
-    rcParams["font.size"] = fontsize
-    rcParams["font.family"] = "Arial"
+    ys = []
+    cats = []
 
     for i in range(1, 5):
 
         for j in range(1, 3):
 
-            print(f"Making figure {j} from category {i} ...", end=" ")
-
-            _, ax = plt.subplots(1, 1, constrained_layout=True)
+            print(f"Making sound {j} from category {i} ...")
             omega = np.random.random(4) * 2.5
             omega = omega[0] if i < 4 else random_walk(omega, dur)
             w = np.random.choice([-1, 1], 4) * 2 ** (np.random.random(4) * 5 + 0.5)
@@ -147,28 +207,136 @@ def make_figs(seed, dpi, fontsize, labels, aspect, ticks, ext, cmap):
             else:
                 w = random_walk(w, dur)
             delta = 0 if i == 1 else 0.9
-            y, a = ripple_sound(dur, n, omega, w, delta, *args)
-            print("done making sound ...", end=" ")
-            f, t, Sxx = spectrogram(y, sr, "hamming", 521)
-            mask = (f >= f0) & (f <= fm1)
-            f = f[mask]
-            Sxx = Sxx[mask, ...]
-            ax.pcolormesh(t, f, np.log(Sxx), rasterized=True)
-            ax.set_yscale("log", basey=2)
-            ax.set_ylabel("Frequency (Hz)")
-            ax.set_xlabel("Time (s)")
-            if labels:
-                ax.set_title(f"Category {i}")
-            if not ticks:
-                ax.set_xticks([], [])
-                ax.set_yticks([], [])
-            print("done making figure ...", end=" ")
-
-            f = f"ripple-{i}-{j}.{ext}"
-            plt.savefig(f, dpi=dpi)
-            print(f"saved to {f}")
+            s = np.random.randint(2 ** 31)  # the sounds draw from their own generators
+            if cache is None:
+                rng = np.random.default_rng(s)
+                y, _ = ripple_sound(dur, n, omega, w, delta, *args, rng=rng)
+            else:
+                y = cache(ripple_sound, dur, n, omega, w, delta, *args, seed=s)
+            ys.append(y)
+            cats.append((i, j))
+
+    return np.stack(ys), np.array(cats), f0, fm1
+
+
+def make_spectrograms(seed, fn=None, cache=None):
+    """Compute log-magnitude spectrograms of all the ripple sounds at once.
+
+    The spectrograms of all sounds are computed by a single call to `spectrogram` on
+    the stacked waveforms and saved to a compressed `.npz` file. If that file already
+    exists it is loaded instead, so figures can be re-rendered without synthesizing
+    any sounds or computing any STFTs. The file records a hash of this script's
+    source code and the seed, and it is only reused if the hash still matches, so
+    editing the sound parameters makes fresh spectrograms.
+
+    Args:
+        seed (int): Seed passed to `make_sounds`.
+        fn (:obj:`str`, optional): Name of the `.npz` file. Defaults to
+            "ripple-spectrograms-{seed}-{hash}.npz".
+        cache (:obj:`StimulusCache`, optional): Passed to `make_sounds`.
+
+    Returns:
+        specs (dict): Contains the frequencies "f", times "t", log magnitudes "logS"
+            with shape `(8, len(f), len(t))`, categories "cats", and the hash "key".
+
+    """
+    key = StimulusCache.key(make_sounds, (seed,), {}, None)
+    fn = f"ripple-spectrograms-{seed}-{key[:12]}.npz" if fn is None else fn
+    if os.path.exists(fn):
+        with np.load(fn) as npz:
+            specs = dict(npz)
+        if specs.get("key") == key:
+            return specs
+        print(f"{fn} is out of date")
+
+    ys, cats, f0, fm1 = make_sounds(seed, cache)
+    print("Computing spectrograms ...")
+    f, t, Sxx = spectrogram(ys, sr, "hamming", 521)
+    mask = (f >= f0) & (f <= fm1)
+    specs = {
+        "f": f[mask],
+        "t": t,
+        "logS": np.log(Sxx[:, mask]).astype(np.float32),
+        "cats": cats,
+        "key": key,
+    }
+    np.savez_compressed(fn, **specs)
+    print(f"saved to {fn}")
+    return specs
+
+
+def render_figs(specs, dpi, fontsize, labels, aspect, ticks, ext, cmap):
+    """Plot precomputed spectrograms; saving the figs to the current directory.
+
+    Args:
+        specs (dict): Spectrograms from `make_spectrograms`.
+        dpi (int): Resolution of figures.
+        fontsize (int): For axis and tick labels.
+        labels (bool): Add the category number to the top of the figure.
+        aspect (float): Makes the figure longer by this factor.
+        ticks (bool): Show ticks on axes.
+        ext (str): File extension. For vector graphics, choose "svg". For raster, choose
+            "png". Either way, the spectrogram itself is a raster; this just effects the
+            axes.
+        cmap (str): Name of the colormap. Default is "viridis". Other good options are
+            "cividis", "plasma" and "inferno". Don't use "jet"!
+
+    """
+    from matplotlib import rcParams
+
+    figsize = rcParams["figure.figsize"]
+    rcParams["figure.figsize"] = [figsize[0], int(figsize[1] * aspect)]
+    rcParams["font.size"] = fontsize
+    rcParams["font.family"] = "Arial"
+
+    f, t = specs["f"], specs["t"]
+    for (i, j), logS in zip(specs["cats"], specs["logS"]):
+
+        print(f"Making figure {j} from category {i} ...", end=" ")
+        _, ax = plt.subplots(1, 1, constrained_layout=True)
+        ax.pcolormesh(t, f, logS, rasterized=True, cmap=cmap)
+        ax.set_yscale("log", basey=2)
+        ax.set_ylabel("Frequency (Hz)")
+        ax.set_xlabel("Time (s)")
+        if labels:
+            ax.set_title(f"Category {i}")
+        if not ticks:
+            ax.set_xticks([], [])
+            ax.set_yticks([], [])
+
+        fn = f"ripple-{i}-{j}.{ext}"
+        plt.savefig(fn, dpi=dpi)
+        plt.close()
+        print(f"saved to {fn}")
+
+
+def make_figs(seed, dpi, fontsize, labels, aspect, ticks, ext, cmap, cache=None):
+    """Create and plot some ripple sounds; saving the figs to the current directory.
+
+    Sounds and spectrograms are only computed the first time this is called with a
+    given seed (see `make_spectrograms`); subsequent calls just redraw the figures.
+
+    Args:
+        seed (int): Seed the random-number generator. Choose a different value to create
+            different waveforms.
+        dpi (int): Resolution of figures.
+        fontsize (int): For axis and tick labels.
+        labels (bool): Add the category number to the top of the figure.
+        aspect (float): Makes the figure longer by this factor.
+        ticks (bool): Show ticks on axes.
+        ext (str): File extension. For vector graphics, choose "svg". For raster, choose
+            "png". Either way, the spectrogram itself is a raster; this just effects the
+            axes.
+        cmap (str): Name of the colormap. Default is "viridis". Other good options are
+            "cividis", "plasma" and "inferno". Don't use "jet"!
+        cache (:obj:`StimulusCache`, optional): Cache of previously synthesized
+            sounds. If omitted, the sounds are not cached.
+
+    """
+    specs = make_spectrograms(seed, cache=cache)
+    render_figs(specs, dpi, fontsize, labels, aspect, ticks, ext, cmap)
 
 
 if __name__ == "__main__":
 
-    make_figs(0, 300, 18, True, 1.5, True, "png", "viridis")
+    make_figs(0, 300, 18, True, 1.5, True, "png", "viridis", StimulusCache())
@@ -0,0 +1,253 @@
+"""Benchmark the audio synthesis functions.
+
+Times `ripple_sound`, `sinusoid`, `Generator.generate`, and the stimulus generated by
+`trial` in `sdt-yn-experiment.py` over a sweep of numbers of sinusoids, durations,
+and sample rates. Each case runs in a fresh process so that its peak resident set
+size can be measured. Results are appended to a JSON history file and compared
+against a stored baseline; the script exits with status 1 if any case has become
+slower or hungrier than the baseline by more than the tolerance, or could not be run
+at all.
+
+Usage:
+
+    python bench-synthesis.py [--quick] [--update-baseline] [--tolerance 0.25]
+
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import get_context
+
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def cases(quick=False):
+    """Returns the benchmark cases.
+
+    Args:
+        quick (:obj:`bool`, optional): Use a small sweep for a fast sanity check.
+
+    Returns:
+        cases (list): Dictionaries describing each case.
+
+    """
+    ns = (100, 300) if quick else (100, 300, 1000)
+    durs = (0.5,) if quick else (0.5, 1)
+    srs = (22050, 44100) if quick else (22050, 44100, 96000)
+    modes = {"default": {}, "chunked": {"max_mem": 2 ** 26}}
+    lst = []
+    for n, dur, sr, mode in product(ns, durs, srs, modes):
+        lst.append(
+            {
+                "func": "ripple_sound",
+                "name": f"ripple_sound[{mode},n={n},dur={dur},sr={sr}]",
+                "n": n,
+                "dur": dur,
+                "sr": sr,
+                "kwargs": modes[mode],
+            }
+        )
+    for dur, sr, dtype in product(durs, srs, ("float64", "int16")):
+        lst.append(
+            {
+                "func": "sinusoid",
+                "name": f"sinusoid[{dtype},dur={dur},sr={sr}]",
+                "dur": dur,
+                "sr": sr,
+                "kwargs": {"dtype": dtype},
+            }
+        )
+    lst.append({"func": "generate", "name": "generate", "dur": 2, "sr": 22050})
+    for dtype in ("float64", "int16"):
+        lst.append(
+            {
+                "func": "trial",
+                "name": f"trial[{dtype}]",
+                "dur": 0.1,
+                "sr": 44100,
+                "kwargs": {"dtype": dtype},
+            }
+        )
+    return lst
+
+
+def load(name):
+    """Imports a script from this directory, even if its name contains hyphens."""
+    spec = importlib.util.spec_from_file_location(
+        name.replace("-", "_"), os.path.join(here, f"{name}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_case(case, repeats=3):
+    """Runs a single case and measures it. Meant to be called in a fresh process.
+
+    Args:
+        case (dict): Case from `cases`.
+        repeats (:obj:`int`, optional): The fastest of this many runs is reported.
+
+    Returns:
+        result (dict): The case with its wall time, peak RSS, and throughput added,
+            or a "skipped" entry if a dependency is missing.
+
+    """
+    sys.path.insert(0, here)
+    func, sr, kwargs = case["func"], case["sr"], case.get("kwargs", {})
+    try:
+        if func == "ripple_sound":
+            module = load("ripple-sounds")
+            module.sr = sr
+            args = (case["dur"], case["n"], 1, 8, 0.9, 0, 250, 8000)
+            call = lambda: module.ripple_sound(*args, **kwargs)
+        elif func == "sinusoid":
+            module = load("pure-tones")
+            call = lambda: module.sinusoid(case["dur"], 1000, 0, 60, sr=sr, **kwargs)
+        elif func == "generate":
+            module = load("qt-sound-example")
+            generator = module.Generator(sr)
+            generator.volume = 16384
+            call = lambda: generator.generate(int(case["dur"] * sr))
+        elif func == "trial":
+            module = load("sdt-yn-experiment")
+            call = lambda: module.stimulus(True, **kwargs)
+    except (ImportError, OSError) as e:  # e.g., PyQt5 or PortAudio is missing
+        return {**case, "skipped": str(e)}
+
+    wall = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        call()
+        wall = min(wall, time.perf_counter() - t0)
+
+    # ru_maxrss is in kB on Linux but in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss /= 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+    samples = int(case["dur"] * sr)
+    return {
+        **case,
+        "wall_s": wall,
+        "peak_rss_mb": rss,
+        "samples": samples,
+        "samples_per_s": samples / wall,
+    }
+
+
+def run(quick=False):
+    """Runs every case, each in its own process.
+
+    Args:
+        quick (:obj:`bool`, optional): Use a small sweep.
+
+    Returns:
+        run (dict): Metadata about the environment and the results of every case.
+
+    """
+    import numpy as np
+
+    results = []
+    for case in cases(quick):
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(run_case, case).result()
+        if "skipped" in result:
+            print(f"{result['name']}: skipped ({result['skipped']})")
+        else:
+            print(
+                f"{result['name']}: {result['wall_s'] * 1e3:.1f} ms, "
+                f"{result['peak_rss_mb']:.0f} MB, "
+                f"{result['samples_per_s']:.3g} samples/s"
+            )
+        results.append(result)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Finds cases that have regressed relative to a baseline.
+
+    Args:
+        results (dict): Output of `run`.
+        baseline (dict): An earlier output of `run`.
+        tolerance (:obj:`float`, optional): Allowed fractional increase in wall time
+            or peak RSS.
+
+    Returns:
+        regressions (list): Descriptions of each regression. A case that has a
+            baseline but was skipped counts as one, so that a missing dependency
+            cannot pass unnoticed.
+
+    """
+    old = {r["name"]: r for r in baseline["results"] if "skipped" not in r}
+    regressions = []
+    for r in results["results"]:
+        if r["name"] not in old:
+            continue
+        if "skipped" in r:
+            regressions.append(f"{r['name']}: skipped ({r['skipped']})")
+            continue
+        for key in ("wall_s", "peak_rss_mb"):
+            ratio = r[key] / old[r["name"]][key]
+            if ratio > 1 + tolerance:
+                regressions.append(f"{r['name']}: {key} is {ratio:.2f}x the baseline")
+    return regressions
+
+
+def main():
+    """Run the benchmarks, record them, and check them against the baseline.
+
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="small sweep")
+    parser.add_argument("--history", default="bench-history.json")
+    parser.add_argument("--baseline", default="bench-baseline.json")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run(args.quick)
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as fr:
+            history = json.load(fr)
+    history.append(results)
+    with open(args.history, "w") as fw:
+        json.dump(history, fw, indent=1)
+
+    skipped = [r["name"] for r in results["results"] if "skipped" in r]
+    if skipped:
+        print(f"WARNING {len(skipped)} of {len(results['results'])} cases skipped")
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as fw:
+            json.dump(results, fw, indent=1)
+        print(f"saved baseline to {args.baseline}")
+        return
+
+    with open(args.baseline) as fr:
+        baseline = json.load(fr)
+    regressions = compare(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    if regressions:
+        sys.exit(1)
+    print("no regressions")
+
+
+if __name__ == "__main__":
+
+    main()
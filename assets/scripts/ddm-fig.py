@@ -1,12 +1,13 @@
 """Create a DDM figure.
 
 """
-import hddm
 import numpy as np
+from scipy.signal import fftconvolve
 from scipy.stats import norm
 import matplotlib.pyplot as plt
 from matplotlib.gridspec import GridSpec
-from tqdm import tqdm
+
+from wiener import paths, pdf, simulate
 
 
 def setupfig():
@@ -28,6 +29,33 @@ def delabel(ax):
     ax.yaxis.set_ticks([])
 
 
+def binned_kde(x, support, bandwidth):
+    """Estimate the density of RTs on an evenly spaced grid starting at 0.
+
+    The RTs are linearly binned onto the grid and the bin counts are convolved with a
+    Gaussian kernel by FFT, so the cost barely depends on the number of RTs. RTs
+    cannot be negative, so the kernels are reflected at 0. Like the sum of a kernel
+    per RT, the result integrates to the number of RTs rather than 1.
+
+    """
+    n = len(support)
+    dx = support[1] - support[0]
+
+    # linear binning
+    pos = x / dx
+    i = np.floor(pos).astype(int)
+    w = pos - i
+    counts = (np.bincount(i, 1 - w, n + 1) + np.bincount(i + 1, w, n + 1))[:n]
+
+    # convolve the counts, mirrored about 0, with the kernel; the bin at 0 is its own
+    # mirror image, so it counts twice
+    k = np.arange(-(n - 1), n)
+    kernel = norm.pdf(k * dx, 0, bandwidth)
+    counts[0] *= 2
+    mirrored = np.concatenate([counts[:0:-1], counts])
+    return fftconvolve(mirrored, kernel)[2 * (n - 1) : 3 * (n - 1) + 1]
+
+
 def kde(ax, x, mx, c):
     """Plot a KDE for reaction times.
 
@@ -35,14 +63,15 @@ def kde(ax, x, mx, c):
     x = x[x <= mx]
     bandwidth = 0.8 * x.std() * x.size ** (-1 / 5.0)
     support = np.linspace(0, mx, 500)
-    kernels = []
+    density = binned_kde(x, support, bandwidth)
+
+    return curve(ax, support, density, c)
 
-    for x_i in tqdm(x):
 
-        kernel = norm(x_i, bandwidth).pdf(support)
-        kernels.append(kernel)
-        density = np.sum(kernels, axis=0)
+def curve(ax, support, density, c):
+    """Plot a density.
 
+    """
     my = np.max(density)
     ax.plot(support, density, c=c)
     ax.fill_between(support, 0, density, alpha=0.5, facecolor=c)
@@ -60,48 +89,30 @@ def traces(ax, n, mx, **params):
     delta = x[1]
     nd_samples = np.round(params["t"] / delta).astype(int)
     d_samples = len(x) - nd_samples
-    y0 = np.zeros(nd_samples) * np.nan
-    y0[-1] = 0
-
-    for i in range(n):
-
-        y1 = np.cumsum(norm.rvs(params["v"] * delta, np.sqrt(delta), size=d_samples))
-        y = params["a"] * params["z"] + np.concatenate([y0, y1])
-
-        try:
-
-            idx1 = np.where(y > params["a"])[0][0] + 1
+    y, response = paths(params["v"], params["a"], params["z"], n, d_samples, delta)
+    y = np.concatenate([np.full((n, nd_samples - 1), np.nan), y], axis=1)
 
-        except:
+    for y_i, r in zip(y, response):
 
-            idx1 = np.inf
+        if r == 1:
 
-        try:
+            ax.plot(x, y_i, c="C0", zorder=-12, alpha=0.25)
 
-            idx2 = np.where(y < 0)[0][0] + 1
+        if r == 0:
 
-        except:
+            ax.plot(x, y_i, c="C3", zorder=-11, alpha=0.25)
 
-            idx2 = np.inf
-
-        if idx1 < idx2:
-
-            y[idx1:] = np.nan
-            ax.plot(x, y, c="C0", zorder=-12, alpha=0.25)
-
-        if idx2 < idx1:
-
-            y[idx2:] = np.nan
-            ax.plot(x, y, c="C3", zorder=-11, alpha=0.25)
-
-        ax.set_ylim(0, params["a"])
-        ax.set_xlim(0, mx)
-        delabel(ax)
+    ax.set_ylim(0, params["a"])
+    ax.set_xlim(0, mx)
+    delabel(ax)
 
 
-def ddmfig(**params):
+def ddmfig(exact=False, **params):
     """Draw a DDM plot with the given parameter values.
 
+    If `exact` is True, the RT distributions are drawn from their exact densities
+    rather than estimated from simulated data.
+
     """
     mx = 3.5  # max x-value; adjust this if simulated RTs are slower/faster
     size = 1500  # increase this number for better KDEs
@@ -114,16 +125,31 @@ def ddmfig(**params):
     ax = plt.subplot(gs[1])
     traces(ax, ntraces, mx, **params)
 
-    # data for kdes
-    df, _ = hddm.generate.gen_rand_data(params, subjs=1, size=size)
+    if exact:
+
+        support = np.linspace(0, mx, 500)
+
+        # top density
+        ax = plt.subplot(gs[0])
+        my = curve(ax, support, pdf(support, 1, **params), "C0")
+
+        # bottom density
+        ax = plt.subplot(gs[2])
+        curve(ax, support, pdf(support, 0, **params), "C3")
+
+    else:
+
+        # data for kdes
+        rt, response = simulate(size=size, **params)
+
+        # top KDE
+        ax = plt.subplot(gs[0])
+        my = kde(ax, rt[response == 1], mx, "C0")
 
-    # top KDE
-    ax = plt.subplot(gs[0])
-    my = kde(ax, df[df.response == 1].rt.values, mx, "C0")
+        # bottom KDE
+        ax = plt.subplot(gs[2])
+        kde(ax, rt[response == 0], mx, "C3")
 
-    # bottom KDE
-    ax = plt.subplot(gs[2])
-    kde(ax, df[df.response == 0].rt.values, mx, "C3")
     ax.set_ylim(0, my * 1.05)
     ax.invert_yaxis()
 
@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 from scipy import interpolate
 import matplotlib.pyplot as plt
@@ -138,20 +140,22 @@ Tf = np.array(
 
 
 def elc(phon, frequencies=None):
-    """Returns an equal-loudness contour.
+    """Returns one or more equal-loudness contours.
 
     Args:
-        phon (float): Phon value of the contour.
+        phon (:obj:`float` or `array`-like): Phon value(s) of the contour(s).
         frequencies (:obj:`np.ndarray`, optional): Frequencies to evaluate. If not
             passed, all 29 points of the ISO standard are returned. Any frequencies not
             present in the standard are found via spline interpolation.
 
     Returns:
-        contour (np.ndarray): db SPL values.
+        contour (np.ndarray): db SPL values, with one row per phon value if `phon` is
+            an array.
 
     """
-    assert 0 <= phon <= 90, f"{phon} is not [0, 90]"
-    Ln = phon
+    phon = np.asarray(phon, dtype=float)
+    assert np.all((0 <= phon) & (phon <= 90)), f"{phon} is not [0, 90]"
+    Ln = phon[..., None]
     Af = (
         4.47e-3 * (10 ** (0.025 * Ln) - 1.15)
         + (0.4 * 10 ** (((Tf + Lu) / 10) - 9)) ** af
@@ -160,14 +164,157 @@ def elc(phon, frequencies=None):
 
     if frequencies is not None:
 
+        frequencies = np.asarray(frequencies)
         assert frequencies.min() >= f.min(), "Frequencies are too low"
         assert frequencies.max() <= f.max(), "Frequencies are too high"
-        tck = interpolate.splrep(f, Lp, s=0)
-        Lp = interpolate.splev(frequencies, tck, der=0)
+        B = basis(frequencies).reshape(-1, len(f))
+        Lp = (Lp.reshape(-1, len(f)) @ B.T).reshape(phon.shape + frequencies.shape)
 
     return Lp
 
 
+def basis(frequencies):
+    """Evaluates the interpolating spline of each point of the ISO standard.
+
+    Spline interpolation is linear in the values being interpolated, so the spline
+    through any contour is the weighted sum of the splines through each of the 29
+    points of the standard with a value of 1 and all others 0. These are fitted
+    once and shared by all phon values, so evaluating a whole family of contours is
+    a single matrix product. The splines are identical to those from
+    `interpolate.splrep` with `s=0`.
+
+    Args:
+        frequencies (np.ndarray): Frequencies to evaluate.
+
+    Returns:
+        B (np.ndarray): Weights of the 29 points at each frequency.
+
+    """
+    global _basis
+    if _basis is None:
+        _basis = interpolate.CubicSpline(f, np.eye(len(f)))
+    return _basis(frequencies)
+
+
+_basis = None
+
+
+def inverse_table(fn=None, n=512, step=0.1):
+    """Tabulates loudness level as a function of frequency and SPL.
+
+    Contours are evaluated on a dense grid of phon values and log-spaced
+    frequencies, and each frequency is inverted by linear interpolation onto an
+    evenly spaced grid of SPL values. SPLs outside the range of the standard at a
+    given frequency (below 0 or above 90 phon) are extrapolated linearly from the
+    nearest edge, so that interpolating near the edges stays well defined and
+    accurate; `spl2phon` masks them afterwards.
+
+    Args:
+        fn (:obj:`str`, optional): If given, the table is loaded from this `.npz` file
+            if it exists, or else calculated and saved to it.
+        n (:obj:`int`, optional): Number of frequencies.
+        step (:obj:`float`, optional): Spacing of phon and SPL values.
+
+    Returns:
+        table (dict): Arrays `logf` (log10 frequencies), `spl` (dB SPL), and `phon`,
+            the loudness level at each frequency and SPL.
+
+    """
+    if fn is not None and os.path.exists(fn):
+        with np.load(fn) as data:
+            return dict(data)
+
+    logf = np.linspace(np.log10(f.min()), np.log10(f.max()), n)
+    phons = np.arange(0, 90 + step / 2, step)
+    Lp = elc(phons, 10 ** logf)
+    spl = np.arange(np.floor(Lp.min()), np.ceil(Lp.max()) + step / 2, step)
+    phon = np.array([np.interp(spl, Lp[:, i], phons) for i in range(n)])
+    lo = spl < Lp[0, :, None]
+    phon[lo] = ((spl - Lp[0, :, None]) / (Lp[1] - Lp[0])[:, None] * step)[lo]
+    hi = spl > Lp[-1, :, None]
+    slope = step / (Lp[-1] - Lp[-2])[:, None]
+    phon[hi] = (phons[-1] + (spl - Lp[-1, :, None]) * slope)[hi]
+    table = {"logf": logf, "spl": spl, "phon": phon}
+
+    if fn is not None:
+        np.savez(fn, **table)
+    return table
+
+
+def spl2phon(frequencies, spl, table=None):
+    """Finds the loudness levels of tones.
+
+    This is the inverse of `elc`. Rather than solving for each tone separately, the
+    loudness level is interpolated bilinearly from a precomputed table, so millions
+    of tones can be looked up at once.
+
+    Args:
+        frequencies (:obj:`array`-like): Frequencies in Hz.
+        spl (:obj:`array`-like): SPLs in dB, broadcastable against `frequencies`.
+        table (:obj:`dict`, optional): Output of `inverse_table`. If not passed, a
+            default table is calculated the first time it is needed.
+
+    Returns:
+        phon (np.ndarray): Loudness levels, or NaN for tones outside the range of the
+            standard (below 0 or above 90 phon, or outside 20 to 12,500 Hz).
+
+    """
+    global _inverse
+    if table is None:
+        if _inverse is None:
+            _inverse = inverse_table()
+        table = _inverse
+    lookup = interpolate.RegularGridInterpolator(
+        (table["logf"], table["spl"]), table["phon"], bounds_error=False
+    )
+    frequencies, spl = np.broadcast_arrays(np.asarray(frequencies, float), spl)
+    phon = lookup(np.stack([np.log10(frequencies), spl], -1))
+
+    # the table extends beyond 0 and 90 phon, so tones beyond them are masked here, by
+    # comparing against the extreme contours at exactly the queried frequencies
+    inside = (f.min() <= frequencies) & (frequencies <= f.max())
+    lo, hi = interpolate.CubicSpline(f, elc([0, 90]), axis=-1)(
+        np.clip(frequencies, f.min(), f.max())
+    )
+    inside &= (lo - 1e-6 <= spl) & (spl <= hi + 1e-6)
+    return np.where(inside, phon, np.nan)
+
+
+_inverse = None
+
+
+def inverse_accuracy(n=2000, phons=(0, 0.2, 10, 45.5, 89.8, 90), table=None):
+    """Checks `spl2phon` by feeding it the output of `elc`.
+
+    Args:
+        n (:obj:`int`, optional): Number of log-spaced frequencies to check.
+        phons (:obj:`tuple`, optional): Loudness levels to check. These should
+            include the edges of the range of the standard, 0 and 90 phon.
+        table (:obj:`dict`, optional): Output of `inverse_table`.
+
+    Returns:
+        report (list): One dictionary per loudness level containing the proportion
+            of round trips that gave NaN and the maximum absolute error in phon.
+
+    """
+    x = np.logspace(np.log10(f.min()), np.log10(f.max()), n)
+    report = []
+    for p in phons:
+        est = spl2phon(x, elc(p, x), table)
+        report.append(
+            {
+                "phon": p,
+                "nan": np.isnan(est).mean(),
+                "error": np.nanmax(np.abs(est - p), initial=0),
+            }
+        )
+        print(
+            f"{p} phon: {report[-1]['nan']:.1%} NaN, max error "
+            f"{report[-1]['error']:.2g} phon"
+        )
+    return report
+
+
 def plot_elcs():
     """Makes the equal-loudness-contour plot.
 
@@ -178,9 +325,10 @@ def plot_elcs():
     fig, ax = plt.subplots(1, 1, constrained_layout=True)
     x = np.logspace(np.log10(f.min()), np.log10(f.max()), 1000)
 
-    for p in range(0, 100, 10):
+    phons = range(0, 100, 10)
+    for p, y in zip(phons, elc(phons, x)):
         c, l = ("C0", None) if p != 60 else ("C1", "60 phon")
-        ax.plot(x, elc(p, x), c=c, label=l)
+        ax.plot(x, y, c=c, label=l)
 
     ax.legend(fancybox=False, framealpha=0)
     ax.set_xscale("log")
@@ -0,0 +1,51 @@
+"""Calibrate the levels of sinusoids so that they are equally loud.
+
+The equal-loudness contours themselves are defined in `equal-loudness.py`, which is
+loaded from this directory.
+
+"""
+import importlib.util
+import os
+
+from functools import lru_cache
+
+import numpy as np
+
+
+a0 = 1e-5  # reference amplitude
+
+_spec = importlib.util.spec_from_file_location(
+    "equal_loudness", os.path.join(os.path.dirname(__file__), "equal-loudness.py")
+)
+equal_loudness = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(equal_loudness)
+
+
+def gains(f, phon, a0=a0):
+    """Returns the amplitudes at which sinusoids have a given loudness level.
+
+    Each sinusoid is given the SPL of the `phon` equal-loudness contour at its
+    frequency. The gains are cached for each combination of frequencies and level, so
+    synthesizing many stimuli with the same frequencies costs one lookup per stimulus.
+
+    Args:
+        f (:obj:`float` or `array`-like): Frequencies in Hz, within the range of the
+            ISO standard (20 to 12,500 Hz).
+        phon (float): Loudness level.
+        a0 (:obj:`float`, optional): Amplitude of a 0-dB tone.
+
+    Returns:
+        g (np.ndarray): Peak amplitude of each sinusoid. This array is shared by all
+            callers, so it is read-only.
+
+    """
+    f = np.atleast_1d(np.asarray(f, dtype=float))
+    return _gains(f.tobytes(), float(phon), a0)
+
+
+@lru_cache(maxsize=128)
+def _gains(fb, phon, a0):
+
+    g = a0 * 10 ** (equal_loudness.elc(phon, np.frombuffer(fb)) / 20)
+    g.flags.writeable = False
+    return g
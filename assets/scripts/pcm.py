@@ -0,0 +1,52 @@
+"""Convert waveforms to the sample types accepted by `sounddevice` and WAV files.
+
+"""
+import warnings
+
+import numpy as np
+
+
+dtypes = ("float64", "float32", "int16")
+
+
+def as_dtype(y, dtype="float64"):
+    """Returns a waveform with the requested sample type.
+
+    Floating-point waveforms are assumed to be at full scale when their amplitude is
+    1, which is the convention used by `sounddevice` and by floating-point WAV files.
+    Converting to 16-bit PCM therefore multiplies by 32767 and rounds. Any samples
+    beyond full scale are clipped, and a warning is issued saying how many.
+
+    Args:
+        y (np.array): Floating-point waveform.
+        dtype (:obj:`str`, optional): One of "float64", "float32", or "int16".
+
+    Returns:
+        y (np.array): Waveform with the requested sample type.
+
+    """
+    assert dtype in dtypes, f"{dtype} is not one of {dtypes}"
+    if dtype != "int16":
+        return y.astype(dtype, copy=False)
+    clipped = np.count_nonzero(np.abs(y) > 1)
+    if clipped:
+        warnings.warn(f"{clipped} of {y.size} samples clipped", RuntimeWarning)
+        y = np.clip(y, -1, 1)
+    return np.rint(y * 32767).astype(np.int16)
+
+
+def working_dtype(dtype):
+    """Returns the floating-point type in which to synthesize a waveform.
+
+    Only float64 waveforms are synthesized in double precision; 16-bit PCM has far
+    less resolution than single precision, so there is no point in more.
+
+    Args:
+        dtype (str): Requested sample type.
+
+    Returns:
+        ftype (type): Either `np.float64` or `np.float32`.
+
+    """
+    assert dtype in dtypes, f"{dtype} is not one of {dtypes}"
+    return np.float64 if dtype == "float64" else np.float32
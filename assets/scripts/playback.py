@@ -0,0 +1,294 @@
+"""Gapless, sample-accurate playback of sequences of stimuli.
+
+`sd.play` opens a new output stream for every sound, so each one is delayed by the
+start-up latency of the audio device, and the interval between successive sounds
+jitters. A `Sequencer` instead keeps a single stream open and mixes queued waveforms
+into it inside the stream callback, so that each one starts on exactly the sample it
+was scheduled for. The actual onset of each waveform is reported back once it has
+been played.
+
+Any object with the same constructor and `start`/`stop`/`close` methods as
+`sd.OutputStream` can be used as the backend. `NullStream` is such an object that
+needs no audio device; it can also write everything it "plays" to a WAV file.
+
+"""
+import threading
+import time
+
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class Onset:
+    """Onset of a scheduled waveform, filled in once it has started playing.
+
+    Attributes:
+        requested (int): Sample on which the waveform was scheduled to start.
+        sample (int): Sample on which it actually started. This only differs from
+            `requested` if the waveform was scheduled too late to be played on time.
+        time (float): Time at which its first sample reached the output, according
+            to the clock of the stream (see `sd.OutputStream.time`).
+
+    """
+
+    def __init__(self, requested):
+
+        self.requested = requested
+        self.sample = None
+        self.time = None
+        self._started = threading.Event()
+
+    @property
+    def late(self):
+        """Number of samples by which the waveform started late."""
+        return self.sample - self.requested
+
+    def wait(self, timeout=None):
+        """Blocks until the waveform has started playing.
+
+        Args:
+            timeout (:obj:`float`, optional): Give up after this many s.
+
+        Returns:
+            time (float): The onset time, or `None` on a timeout.
+
+        """
+        self._started.wait(timeout)
+        return self.time
+
+
+class Sequencer:
+    """Plays queued waveforms through a persistent output stream.
+
+    Waveforms may overlap, in which case they are summed. Samples are counted from
+    the moment the stream is started, and all onsets are expressed on this count.
+
+    Args:
+        sr (:obj:`int`, optional): Sample rate in Hz.
+        channels (:obj:`int`, optional): Number of output channels.
+        block (:obj:`int`, optional): Number of samples per callback.
+        backend (:obj:`callable`, optional): Stream class. Defaults to
+            `sd.OutputStream`; pass `NullStream` to run without an audio device.
+        **kwargs: Passed to the backend.
+
+    Examples:
+
+        >>> with Sequencer(backend=NullStream) as seq:
+        ...     onsets = [seq.schedule(y, gap=0.5) for y in stimuli]
+        ...     seq.wait()
+        >>> [o.sample for o in onsets]
+
+    """
+
+    def __init__(self, sr=44100, channels=1, block=1024, backend=None, **kwargs):
+
+        if backend is None:
+            import sounddevice as sd
+
+            backend = sd.OutputStream
+        self.sr = sr
+        self.channels = channels
+        self.stream = backend(
+            samplerate=sr,
+            blocksize=block,
+            channels=channels,
+            dtype="float32",
+            callback=self._callback,
+            **kwargs,
+        )
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._queue = []
+        self._pos = 0
+        self._end = 0
+
+    def __enter__(self):
+
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+    def start(self):
+        """Starts the stream."""
+        self.stream.start()
+
+    def close(self):
+        """Stops and closes the stream, discarding anything still queued."""
+        self.stream.stop()
+        self.stream.close()
+
+    @property
+    def now(self):
+        """Number of samples that have been passed to the stream so far."""
+        return self._pos
+
+    def schedule(self, y, at=None, gap=0):
+        """Queues a waveform for playback.
+
+        Args:
+            y (np.array): Waveform with shape `(m,)` or `(m, channels)`. Integer
+                waveforms are assumed to be 16-bit PCM.
+            at (:obj:`int`, optional): Sample on which to start. If omitted, the
+                waveform starts as soon as the previously queued one ends, or on the
+                next block if nothing is queued.
+            gap (:obj:`float`, optional): Silence in s to leave after the previously
+                queued waveform. Ignored if `at` is given.
+
+        Returns:
+            onset (Onset): Filled in once the waveform starts playing.
+
+        """
+        y = np.asarray(y)
+        if y.dtype.kind in "iu":
+            y = y / 32767
+        y = y.astype(np.float32, copy=False)
+        if y.ndim == 1:
+            y = y[:, None]
+        with self._lock:
+            if at is None:
+                at = max(self._end, self._pos) + int(round(gap * self.sr))
+            onset = Onset(at)
+            self._queue.append((at, y, onset))
+            self._end = max(self._end, at + len(y))
+            self._idle.clear()
+        return onset
+
+    def wait(self, timeout=None):
+        """Blocks until everything queued has finished playing.
+
+        Args:
+            timeout (:obj:`float`, optional): Give up after this many s.
+
+        Returns:
+            done (bool): `False` on a timeout.
+
+        """
+        return self._idle.wait(timeout)
+
+    def _callback(self, outdata, frames, time, status):
+
+        outdata.fill(0)
+        with self._lock:
+            pos = self._pos
+            keep = []
+            for item in self._queue:
+                at, y, onset = item
+                if onset.sample is None:
+                    if at >= pos + frames:
+                        keep.append(item)
+                        continue
+                    # waveforms scheduled in the past start as soon as possible
+                    onset.sample = max(at, pos)
+                    dt = (onset.sample - pos) / self.sr
+                    onset.time = time.outputBufferDacTime + dt
+                    onset._started.set()
+                i = max(0, onset.sample - pos)  # first output sample
+                j = max(0, pos - onset.sample)  # first waveform sample
+                k = min(frames - i, len(y) - j)
+                outdata[i : i + k] += y[j : j + k]
+                if j + k < len(y):
+                    keep.append(item)
+            self._queue = keep
+            self._pos = pos + frames
+            if not keep:
+                self._idle.set()
+
+
+class NullStream:
+    """Stand-in for `sd.OutputStream` that needs no audio device.
+
+    A background thread calls the callback block by block, just like a real stream.
+    The output goes nowhere unless `path` is given.
+
+    Args:
+        samplerate (int): Sample rate in Hz.
+        blocksize (int): Number of samples per callback.
+        channels (int): Number of output channels.
+        dtype (:obj:`str`, optional): Sample type of the output.
+        callback (callable): Called as `callback(outdata, frames, time, status)`.
+        finished_callback (:obj:`callable`, optional): Called once the stream stops.
+        speed (:obj:`float`, optional): How many times faster than real time to run.
+            If `None`, the stream runs as fast as the callback allows.
+        path (:obj:`str`, optional): If given, everything played is written to this
+            WAV file when the stream is closed.
+
+    """
+
+    def __init__(
+        self,
+        samplerate,
+        blocksize,
+        channels,
+        callback,
+        dtype="float32",
+        finished_callback=None,
+        speed=1,
+        path=None,
+    ):
+
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.dtype = dtype
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.speed = speed
+        self.path = path
+        self.blocks = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def data(self):
+        """Everything played so far, if it is being recorded."""
+        if not self.blocks:
+            return np.zeros((0, self.channels), self.dtype)
+        return np.concatenate(self.blocks)
+
+    def start(self):
+        """Starts calling the callback."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops calling the callback."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stops the stream and writes the output file, if any."""
+        self.stop()
+        if self.path is not None:
+            from scipy.io import wavfile
+
+            wavfile.write(self.path, self.samplerate, self.data)
+
+    def _run(self):
+
+        frames = self.blocksize
+        n = 0
+        t0 = time.perf_counter()
+        while not self._stop.is_set():
+            outdata = np.zeros((frames, self.channels), self.dtype)
+            t = SimpleNamespace(
+                currentTime=n / self.samplerate,
+                outputBufferDacTime=n / self.samplerate,
+            )
+            self.callback(outdata, frames, t, None)
+            if self.path is not None:
+                self.blocks.append(outdata)
+            n += frames
+            if self.speed is not None:
+                delay = t0 + n / self.samplerate / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        if self.finished_callback is not None:
+            self.finished_callback()
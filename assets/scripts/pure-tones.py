@@ -2,13 +2,16 @@
 
 """
 import numpy as np
-import sounddevice as sd
+
+from loudness import gains
+from pcm import as_dtype, working_dtype
+from stimulus_cache import StimulusCache
 
 a0 = 1e-5  # reference amplitude
 sr = 44100  # sample rate
 
 
-def sinusoid(d, f, phi, l, a0=a0, sr=sr):
+def sinusoid(d, f, phi, l, a0=a0, sr=sr, dtype="float64", phon=None):
     """Generates a pure tone.
 
     A pure tone or sinusoid is a periodic waveform that is some variation on the sine
@@ -21,17 +24,31 @@ def sinusoid(d, f, phi, l, a0=a0, sr=sr):
         l (float): Level in dB.
         a0 (:obj:`float`, optional): Amplitude of a 0-dB tone. Default is 1e-5.
         sr (:obj:`int`, optional): Sample rate in Hz. Default is 44100.
+        dtype (:obj:`str`, optional): Sample type of the waveform; one of "float64"
+            (default), "float32", or "int16". The latter two are computed in single
+            precision, and "int16" is 16-bit PCM ready for playback or a WAV file.
+        phon (:obj:`float`, optional): If given, `l` is ignored and the tone is
+            instead set to the SPL that gives it this loudness level (see
+            `loudness.gains`).
 
     Returns:
         waveform (np.ndarray): Sinusoidal waveform.
 
     """
     t = np.arange(0, int(round(d * sr))) / sr
-    return a0 * 10 ** (l / 20) * np.sin(2 * np.pi * f * t + phi)
+    g = a0 * 10 ** (l / 20) if phon is None else gains(f, phon, a0)[0]
+    if dtype == "float64":
+        return g * np.sin(2 * np.pi * f * t + phi)
+
+    # wrap the phase in double precision so that single precision suffices for the rest
+    theta = ((2 * np.pi * f * t + phi) % (2 * np.pi)).astype(working_dtype(dtype))
+    return as_dtype(g * np.sin(theta), dtype)
 
 
 if __name__ == "__main__":
 
-    tone = sinusoid(1, 400, 0, 60)
+    import sounddevice as sd
+
+    tone = StimulusCache()(sinusoid, 1, 400, 0, 60)
     sd.play(tone, 44100)
     sd.wait()
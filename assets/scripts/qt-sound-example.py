@@ -1,7 +1,7 @@
-from math import pi, sin
-import struct, sys
+import sys
 
-from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, Qt
+import numpy as np
+from PyQt5.QtCore import QIODevice, Qt
 from PyQt5.QtWidgets import (
     QApplication,
     QFormLayout,
@@ -15,6 +15,59 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtMultimedia import QAudio, QAudioDeviceInfo, QAudioFormat, QAudioOutput
 
 
+class Generator(QIODevice):
+    """Generates a tone on demand, as 16-bit PCM.
+
+    The output pulls samples from `readData`, which synthesizes exactly as many as it
+    asks for. The phase is carried over from one read to the next, and changes to
+    `frequency` and `volume` are ramped linearly over the next read, so the tone never
+    clicks. The synthesis itself is in `generate`, which needs no audio device.
+
+    """
+
+    def __init__(self, sr=22050, block=1024, parent=None):
+
+        QIODevice.__init__(self, parent)
+
+        self.sr = sr
+        self.block = block
+        self.frequency = 440
+        self.volume = 0
+        self.theta = 0.0
+        self._frequency = self.frequency
+        self._volume = self.volume
+
+    def generate(self, n):
+        """Synthesizes the next `n` samples as little-endian 16-bit PCM bytes."""
+        if n == 0:
+            return b""
+        ramp = np.arange(1, n + 1) / n
+        f = self._frequency + (self.frequency - self._frequency) * ramp
+        v = self._volume + (self.volume - self._volume) * ramp
+        theta = self.theta + np.cumsum(2 * np.pi * f / self.sr)
+        y = v * np.sin(theta - 2 * np.pi * f / self.sr)
+        self.theta = theta[-1] % (2 * np.pi)
+        self._frequency = self.frequency
+        self._volume = self.volume
+        return y.astype("<i2").tobytes()
+
+    def readData(self, maxlen):
+
+        return self.generate(min(maxlen // 2, self.block))
+
+    def writeData(self, data):
+
+        return -1
+
+    def bytesAvailable(self):
+
+        return 2 * self.block + QIODevice.bytesAvailable(self)
+
+    def isSequential(self):
+
+        return True
+
+
 class Window(QWidget):
     def __init__(self, parent=None):
 
@@ -28,11 +81,9 @@ class Window(QWidget):
         format.setByteOrder(QAudioFormat.LittleEndian)
         format.setSampleType(QAudioFormat.SignedInt)
         self.output = QAudioOutput(format, self)
+        self.output.setBufferSize(2 * 1024)
 
-        self.frequency = 440
-        self.volume = 0
-        self.buffer = QBuffer()
-        self.data = QByteArray()
+        self.generator = Generator(22050, 1024, self)
 
         self.deviceLineEdit = QLineEdit()
         self.deviceLineEdit.setReadOnly(True)
@@ -64,42 +115,28 @@ class Window(QWidget):
         horizontalLayout.addLayout(buttonLayout)
 
         self.play()
-        self.createData()
 
     def changeFrequency(self, value):
 
-        self.frequency = 440 + (value * 2)
-        self.createData()
+        self.generator.frequency = 440 + (value * 2)
 
     def play(self):
 
         if self.output.state() == QAudio.ActiveState:
             self.output.stop()
 
-        if self.buffer.isOpen():
-            self.buffer.close()
+        if self.generator.isOpen():
+            self.generator.close()
 
         if self.output.error() == QAudio.UnderrunError:
             self.output.reset()
 
-        self.buffer.setData(self.data)
-        self.buffer.open(QIODevice.ReadOnly)
-        self.buffer.seek(0)
-
-        self.output.start(self.buffer)
+        self.generator.open(QIODevice.ReadOnly)
+        self.output.start(self.generator)
 
     def changeVolume(self, value):
 
-        self.volume = value
-        self.createData()
-
-    def createData(self):
-
-        self.data.clear()
-        for i in range(2 * 22050):
-            t = i / 22050.0
-            value = int(self.volume * sin(2 * pi * self.frequency * t))
-            self.data.append(struct.pack("<h", value))
+        self.generator.volume = value
 
 
 if __name__ == "__main__":
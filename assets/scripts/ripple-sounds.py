@@ -2,20 +2,55 @@
 
 """
 import numpy as np
-import sounddevice as sd
 import matplotlib.pyplot as plt
 
-from scipy.interpolate import interp1d
 from scipy.io import wavfile
 
+from loudness import gains
+from pcm import as_dtype, working_dtype
+from playback import Sequencer
+from stimulus_cache import StimulusCache
+from trajectories import Trajectory
+
 
 a0 = 1e-5  # reference amplitude
 sr = 44100  # sample rate
 
 
-def ripple_sound(dur, n, omega, w, delta, phi, f0, fm1, l=70):
+def ripple_sound(
+    dur,
+    n,
+    omega,
+    w,
+    delta,
+    phi,
+    f0,
+    fm1,
+    l=70,
+    max_mem=None,
+    nb=None,
+    osc="sin",
+    fft=False,
+    rng=None,
+    dtype="float64",
+    control_rate=None,
+    phon=None,
+):
     """Synthesizes a ripple sound.
 
+    By default the whole `(n, m)` matrices of sinusoids and envelope values are held
+    in memory at once, which takes several hundred MB for a 1-s sound with 1000
+    sinusoids. Passing `max_mem` switches to a chunked mode in which the waveform is
+    accumulated over blocks of samples (and, if necessary, blocks of sinusoids) so
+    that the working set never exceeds the given number of bytes.
+
+    When `omega`, `w`, and `delta` are all constant, the spectrum of the sound is
+    known in closed form: each sinusoid contributes a component at its own frequency
+    and two sidebands `w` Hz either side of it. Passing `fft=True` builds this
+    spectrum directly and synthesizes the sound with a single inverse FFT, which is
+    far cheaper than summing sinusoids for large `n`. Sounds with time-varying
+    parameters fall back to additive synthesis.
+
     Args:
         dur (float): Duration of sound in s.
         n (int): Number of sinusoids.
@@ -30,22 +65,53 @@ def ripple_sound(dur, n, omega, w, delta, phi, f0, fm1, l=70):
         f0 (float): Frequency of the lowest sinusoid in Hz.
         fm1 (float): Frequency of the highest sinusoid in Hz.
         l (:obj:`float`, optional): Level in dB of the sound, assuming a pure tone with
-            peak amplitude `a0` is 0 dB SPL. TODO: Implement this correctly!
+            peak amplitude `a0` is 0 dB SPL. TODO: Implement this correctly! Ignored
+            if `phon` is given.
+        max_mem (:obj:`int`, optional): Memory ceiling in bytes for the per-block
+            working set. If omitted, the sound is synthesized in one go.
+        nb (:obj:`int`, optional): Number of sinusoids per block in chunked mode. If
+            omitted, all sinusoids are used unless that would make the blocks of
+            samples too short to fit within `max_mem`.
+        osc (:obj:`str`, optional): Oscillator backend, either "sin" (default) or
+            "phasor". The latter avoids evaluating `np.sin` for every sinusoid and
+            sample. It pays off most for static and moving ripples in chunked mode,
+            where the blocks stay small. With time-varying `omega` it is several
+            times slower than "sin", especially when the sound is synthesized in one
+            go, so use "sin" for such sounds. See `osc_accuracy` for timings and how
+            closely the two agree.
+        fft (:obj:`bool`, optional): Synthesize static and moving ripples by inverse
+            FFT.
+        rng (:obj:`np.random.Generator`, optional): Source of the random starting
+            phases of the sinusoids. Defaults to the global `np.random` state.
+        dtype (:obj:`str`, optional): Sample type of the waveform; one of "float64"
+            (default), "float32", or "int16". The latter two are synthesized in
+            single precision, which halves memory use. The "int16" waveform is
+            16-bit PCM that can be played or written to a WAV file directly (see
+            `pcm.as_dtype`).
+        control_rate (:obj:`float`, optional): If given and any of `omega`, `w`, or
+            `delta` vary over time, the envelope is evaluated at this rate in Hz and
+            linearly interpolated to the sample rate, while the carriers are still
+            computed exactly at every sample. Since the parameters vary slowly, 1000
+            Hz is plenty.
+        phon (:obj:`float`, optional): If given, the sinusoids are weighted so that
+            they are equally loud rather than by `1 / sqrt(f)` (see
+            `loudness.gains`). Each is set 10 log10(n) dB below the `phon` contour,
+            so that together they have the power of a single tone on it. The sound
+            is not normalized afterwards.
 
     Returns:
         y (np.array): The waveform.
-        a (np.array): The envelope (useful for plotting).
+        a (RippleEnvelope): The envelope (useful for plotting). This is evaluated
+            only on demand, so callers who just want the waveform pay nothing for it.
 
     """
     # create sinusoids
     m = int(dur * sr)  # total number of samples
-    shapea = (1, m)
-    shapeb = (n, 1)
-    t = np.linspace(0, dur, int(m)).reshape(shapea)
-    i = np.arange(n).reshape(shapeb)
+    t = np.linspace(0, dur, int(m))
+    i = np.arange(n)
     f = f0 * (fm1 / f0) ** (i / (n - 1))
-    sphi = 2 * np.pi * np.random.random(shapeb)
-    s = np.sin(2 * np.pi * f * t + sphi)
+    sphi = 2 * np.pi * (np.random if rng is None else rng).random(n)
+    g = 1 / np.sqrt(f) if phon is None else gains(f, phon) / np.sqrt(n)
 
     # create envelope
     x = np.log2(f / f0)
@@ -53,46 +119,752 @@ def ripple_sound(dur, n, omega, w, delta, phi, f0, fm1, l=70):
         wprime = np.cumsum(w) / sr
     else:
         wprime = w * t
-    a = 1 + delta * np.sin(2 * np.pi * (wprime + omega * x) + phi)
+    omega = np.asarray(omega, dtype=float)
+    delta = np.asarray(delta, dtype=float)
 
     # create the waveform
-    y = (a * s / np.sqrt(f)).sum(axis=0)
+    ftype = working_dtype(dtype)
+    dynamic = any(np.ndim(v) for v in (omega, w, delta))
+    if control_rate is not None and dynamic:
+        ctl = (m, control_rate, wprime, omega, delta, phi)
+    else:
+        ctl = None
+    if fft and not dynamic:
+        y = ripple_spectrum(m, t[1] - t[0], omega, w, delta, phi, f, x, sphi, g)
+        y = y.astype(ftype)
+    elif max_mem is None and ftype is np.float64:
+        args = (omega, delta, phi, f, x, sphi, osc, ftype, _envelope_at(ctl, 0, m, x))
+        _, y = _ripple_block(t, wprime, *args, g)
+    elif max_mem is None:
+        # single precision only keeps carrier phases accurate over short spans of
+        # time, so the waveform is synthesized block by block
+        y = np.empty(m, ftype)
+        for k in range(0, m, 4096):
+            q = slice(k, k + 4096)
+            ab = _envelope_at(ctl, k, len(t[q]), x)
+            args = (_at(omega, q), _at(delta, q), phi, f, x, sphi, osc, ftype, ab)
+            _, y[q] = _ripple_block(t[q], wprime[q], *args, g)
+    else:
+        y = np.zeros(m, ftype)
+        itemsize = np.dtype(ftype).itemsize
+        nb, mb = block_sizes(
+            n, m, max_mem, nb, itemsize=itemsize, osc=osc, control=ctl is not None
+        )
+        for j in range(0, n, nb):
+            p = slice(j, j + nb)
+            for k in range(0, m, mb):
+                q = slice(k, k + mb)
+                ab = _envelope_at(ctl, k, len(t[q]), x[p])
+                args = (_at(omega, q), _at(delta, q), phi, f[p], x[p], sphi[p])
+                y[q] += _ripple_block(t[q], wprime[q], *args, osc, ftype, ab, g[p])[1]
 
     # scale to a given SPL
-    # TODO: This is likely wrong; I haven't checked it
-    y /= np.abs(y).max()
-    y *= a0 * 10 ** (l / 20)
+    if phon is None:
+        # TODO: This is likely wrong; I haven't checked it
+        y /= np.abs(y).max()
+        y *= a0 * 10 ** (l / 20)
+
+    a = RippleEnvelope(dur, n, omega, w, delta, phi, f0, fm1)
+    return as_dtype(y, dtype), a
+
+
+class RippleEnvelope:
+    """The envelope of a ripple sound, evaluated on demand.
+
+    Only the synthesis parameters are stored. The envelope can be evaluated at any
+    times and frequencies by calling the object, on a coarse grid for plotting with
+    `grid`, or in full (one value per sinusoid and sample) with `np.asarray`.
+
+    Args:
+        dur (float): Duration of sound in s.
+        n (int): Number of sinusoids.
+        omega (:obj:`float` or `array`-like): Ripple density in Hz.
+        w (:obj:`float` or `array`-like): Ripple drift in Hz.
+        delta (:obj:`float` or `array`-like): Normalized ripple depth.
+        phi (float): Ripple starting phase in radians.
+        f0 (float): Frequency of the lowest sinusoid in Hz.
+        fm1 (float): Frequency of the highest sinusoid in Hz.
+
+    """
+
+    def __init__(self, dur, n, omega, w, delta, phi, f0, fm1):
+
+        self.dur = dur
+        self.n = n
+        self.m = int(dur * sr)
+        self.omega = omega
+        self.w = w
+        self.delta = delta
+        self.phi = phi
+        self.f0 = f0
+        self.fm1 = fm1
+
+    @property
+    def shape(self):
+        """Shape of the full envelope."""
+        return self.n, self.m
+
+    @property
+    def wprime(self):
+        """Cumulative ripple drift at every sample."""
+        if hasattr(self.w, "__iter__"):
+            return np.cumsum(self.w) / sr
+        return self.w * np.linspace(0, self.dur, self.m)
+
+    def __call__(self, t=None, f=None):
+        """Evaluates the envelope.
+
+        Args:
+            t (:obj:`array`-like, optional): Times in s. Defaults to every sample.
+            f (:obj:`array`-like, optional): Frequencies in Hz. Defaults to the
+                frequencies of all the sinusoids.
+
+        Returns:
+            a (np.array): Envelope with shape `(len(f), len(t))`.
+
+        """
+        if t is None:
+            k = np.arange(self.m)
+        else:
+            k = np.asarray(t) * ((self.m - 1) / self.dur)
+        if f is None:
+            x = np.log2(self.fm1 / self.f0) * np.linspace(0, 1, self.n)
+        else:
+            x = np.log2(np.asarray(f) / self.f0)
+        return envelope_at(k, self.wprime, self.omega, self.delta, self.phi, x)
+
+    def __array__(self, dtype=None, copy=None):
+
+        return self().astype(dtype or float, copy=False)
+
+    def grid(self, shape=(250, 500)):
+        """Evaluates the envelope on a coarse grid for plotting.
+
+        The envelope is smooth over time and frequency, so at figure resolution this
+        looks the same as the full envelope.
+
+        Args:
+            shape (:obj:`tuple`, optional): Maximum numbers of rows (sinusoids) and
+                columns (samples) in the grid.
+
+        Returns:
+            a (np.array): The envelope at evenly spaced sinusoids and samples.
+
+        """
+        x = np.log2(self.fm1 / self.f0) * np.linspace(0, 1, min(self.n, shape[0]))
+        k = np.linspace(0, self.m - 1, min(self.m, shape[1]))
+        return envelope_at(k, self.wprime, self.omega, self.delta, self.phi, x)
+
+
+def ripple_spectrum(m, dt, omega, w, delta, phi, f, x, sphi, g=None, oversample=8):
+    """Synthesizes a static or moving ripple sound by inverse FFT.
+
+    Expanding the product of envelope and carrier, sinusoid `i` becomes
 
-    return y, a
+        sin(2 pi f t + sphi) + delta / 2 * cos(2 pi (w - f) t + alpha)
+            - delta / 2 * cos(2 pi (f + w) t + beta),
 
+    where `alpha = 2 pi omega x + phi - sphi` and `beta = 2 pi omega x + phi + sphi`,
+    all weighted by `g`. These components are written straight into the
+    bins of a real spectrum, which is then inverted. Frequencies are rounded to the
+    nearest bin, so the FFT is made `oversample` times longer than the sound (rounded
+    up to a power of two) and truncated afterwards. The largest frequency error is
+    therefore `1 / (2 * N * dt)` Hz, where `N` is the length of the FFT.
 
-def smooth_walk(points, dur):
+    Args:
+        m (int): Number of samples.
+        dt (float): Time between samples in s.
+        omega (float): Ripple density.
+        w (float): Ripple drift in Hz.
+        delta (float): Ripple depth.
+        phi (float): Ripple starting phase in radians.
+        f (np.array): Frequencies of the sinusoids.
+        x (np.array): Those frequencies in octaves above `f0`.
+        sphi (np.array): Starting phases of the sinusoids.
+        g (:obj:`np.array`, optional): Amplitudes of the sinusoids. Defaults to
+            `1 / sqrt(f)`.
+        oversample (:obj:`int`, optional): Minimum ratio of FFT length to `m`.
+
+    Returns:
+        y (np.array): The unscaled sum of the sinusoids.
+
+    """
+    g = 1 / np.sqrt(f) if g is None else g
+    theta = 2 * np.pi * omega * x + phi
+
+    # each component is Re(c * exp(2j * pi * nu * t))
+    nu = np.concatenate([f, w - f, f + w])
+    c = np.concatenate(
+        [
+            -1j * g * np.exp(1j * sphi),
+            delta / 2 * g * np.exp(1j * (theta - sphi)),
+            -delta / 2 * g * np.exp(1j * (theta + sphi)),
+        ]
+    )
+    c = np.where(nu < 0, c.conj(), c)  # Re(c * e^(-iz)) = Re(conj(c) * e^(iz))
+
+    # place components in bins
+    size = 2 ** int(np.ceil(np.log2(oversample * m)))
+    j = np.rint(np.abs(nu) * dt * size).astype(int)
+    keep = j <= size // 2
+    spec = np.zeros(size // 2 + 1, dtype=complex)
+    np.add.at(spec, j[keep], c[keep])
+    spec[1:-1] /= 2  # interior bins appear twice in the full spectrum
+    spec[0] = spec[0].real
+    spec[-1] = spec[-1].real
+    return np.fft.irfft(spec * size, size)[:m]
+
+
+def _ripple_block(
+    t, wprime, omega, delta, phi, f, x, sphi, osc="sin", ftype=float, a=None, g=None
+):
+    """Synthesizes one block of a ripple sound.
+
+    Args:
+        t (np.array): Times of the samples in the block.
+        wprime (np.array): Cumulative ripple drift at those times.
+        omega (np.array): Ripple density; either a scalar or one value per sample.
+        delta (np.array): Ripple depth; either a scalar or one value per sample.
+        phi (float): Ripple starting phase in radians.
+        f (np.array): Frequencies of the sinusoids in the block.
+        x (np.array): Those frequencies in octaves above `f0`.
+        sphi (np.array): Starting phases of the sinusoids.
+        osc (:obj:`str`, optional): Oscillator backend. Either "sin", which evaluates
+            `np.sin` for every sinusoid and sample, or "phasor", which advances
+            complex phasors by multiplication (see `phasors`).
+        ftype (:obj:`type`, optional): Floating-point type in which to synthesize.
+        a (:obj:`np.array`, optional): Precomputed envelope of the block. If given,
+            `wprime`, `omega`, `delta`, and `phi` are ignored.
+        g (:obj:`np.array`, optional): Amplitudes of the sinusoids. Defaults to
+            `1 / sqrt(f)`.
+
+    Returns:
+        a (np.array): The envelope of the block.
+        y (np.array): The unscaled sum of the sinusoids.
+
+    """
+    assert osc in ("sin", "phasor"), f"{osc} is not a valid oscillator backend"
+
+    # move the time origin to the start of the block so that the carrier phases stay
+    # small enough to be represented accurately in single precision
+    sphi = (2 * np.pi * f * t[0] + sphi) % (2 * np.pi)
+    t = t - t[0]
+    g = 1 / np.sqrt(f) if g is None else g
+    t, wprime, omega, delta, f, x, sphi, g = (
+        np.asarray(v, dtype=ftype) for v in (t, wprime, omega, delta, f, x, sphi, g)
+    )
+
+    f = f[:, None]
+    g = g[:, None]
+    if a is not None:
+        a = np.asarray(a, dtype=ftype)
+    if osc == "sin":
+        s = np.sin(2 * np.pi * f * t + sphi[:, None])
+        if a is None:
+            a = 1 + delta * np.sin(2 * np.pi * (wprime + omega * x[:, None]) + phi)
+        return a, (a * s * g).sum(axis=0)
+
+    # carriers advance at a constant rate per sample
+    dt = t[1] if len(t) > 1 else 0
+    s = phasors(sphi, 2 * np.pi * f[:, 0] * dt, len(t))
+
+    # envelope phase is 2 * pi * (wprime + omega * x) + phi, where x is evenly spaced,
+    # so it factorizes into a phasor over time and one that advances over sinusoids
+    if a is None:
+        u = np.exp(1j * (2 * np.pi * wprime + phi))
+        dx = x[1] - x[0] if len(x) > 1 else 0
+        if np.ndim(omega):
+            v = phasors(2 * np.pi * omega * x[0], 2 * np.pi * omega * dx, len(x), 0)
+        else:
+            v = np.exp(2j * np.pi * omega * x)[:, None]
+        a = 1 + delta * (u.imag * v.real + u.real * v.imag)
+    return a, (a * s.imag * g).sum(axis=0)
+
+
+def control_envelope(k, mb, m, control_rate, wprime, omega, delta, phi, x):
+    """Evaluates the ripple envelope of samples `k` to `k + mb` at a control rate.
+
+    The control points are evenly spaced between the first and last samples of the
+    whole sound, and time-varying parameters are linearly interpolated to them. Only
+    the control points spanning the block are evaluated, and these are linearly
+    interpolated to its samples, so the cost is proportional to the block rather
+    than the sound.
+
+    Args:
+        k (int): First sample of the block.
+        mb (int): Number of samples in the block.
+        m (int): Number of samples in the sound.
+        control_rate (float): Control rate in Hz.
+        wprime (np.array): Cumulative ripple drift at every sample of the sound.
+        omega (np.array): Ripple density; either a scalar or one value per sample.
+        delta (np.array): Ripple depth; either a scalar or one value per sample.
+        phi (float): Ripple starting phase in radians.
+        x (np.array): Frequencies of the sinusoids in octaves above `f0`.
+
+    Returns:
+        a (np.array): Envelope with shape `(len(x), mb)`.
+
+    """
+    mc = max(2, int(np.ceil(m / sr * control_rate)) + 1)
+    scale = (mc - 1) / (m - 1)
+    pos = np.arange(k, k + mb) * scale
+    i = np.minimum(pos.astype(int), mc - 2)
+    ac = envelope_at(np.arange(i[0], i[-1] + 2) / scale, wprime, omega, delta, phi, x)
+    frac = pos - i
+    i -= i[0]
+    return ac[:, i] * (1 - frac) + ac[:, i + 1] * frac
+
+
+def envelope_at(k, wprime, omega, delta, phi, x):
+    """Evaluates the ripple envelope at arbitrary sample positions.
+
+    Args:
+        k (np.array): Sample positions, which need not be integers. Time-varying
+            parameters are linearly interpolated to them.
+        wprime (np.array): Cumulative ripple drift at every sample.
+        omega (np.array): Ripple density; either a scalar or one value per sample.
+        delta (np.array): Ripple depth; either a scalar or one value per sample.
+        phi (float): Ripple starting phase in radians.
+        x (np.array): Frequencies of the sinusoids in octaves above `f0`.
+
+    Returns:
+        a (np.array): Envelope with shape `(len(x), len(k))`.
+
+    """
+    k = np.clip(k, 0, len(wprime) - 1)
+    i = np.minimum(k.astype(int), max(len(wprime) - 2, 0))
+    frac = k - i
+
+    def at(v):
+        if not np.ndim(v):
+            return v
+        return v[i] * (1 - frac) + v[np.minimum(i + 1, len(v) - 1)] * frac
+
+    theta = 2 * np.pi * (at(wprime) + at(omega) * x[:, None]) + phi
+    return 1 + at(delta) * np.sin(theta)
+
+
+def _envelope_at(ctl, k, mb, x):
+    """Evaluates a control-rate envelope for samples `k` to `k + mb`.
+
+    `ctl` holds the remaining arguments of `control_envelope`. Returns `None` if it
+    is `None`, so callers can pass the result straight on to `_ripple_block`.
+
+    """
+    if ctl is None:
+        return None
+    return control_envelope(k, mb, *ctl, x)
+
+
+def phasors(theta0, dtheta, k, axis=1):
+    """Returns unit phasors with linearly advancing phases.
+
+    Computes `np.exp(1j * (theta0 + dtheta * np.arange(k)))` for each element of
+    `theta0` and `dtheta` without evaluating a transcendental function for every
+    sample. Only the first phasor and the per-step rotations are evaluated exactly;
+    the rest are filled in by repeatedly multiplying the block computed so far by the
+    rotation over its own length, doubling its size each time. Every phasor is thus
+    at most `log2(k)` multiplications away from an exactly evaluated one, which bounds
+    the drift in magnitude and phase without explicit renormalization. Callers
+    synthesizing in blocks renormalize periodically by starting each block afresh.
+
+    Args:
+        theta0 (np.array): Starting phases in radians.
+        dtheta (np.array): Phase advance per step in radians.
+        k (int): Number of steps.
+        axis (:obj:`int`, optional): Axis of the output along which the phases
+            advance.
+
+    Returns:
+        z (np.array): Complex array with shape `(len(theta0), k)`, or
+            `(k, len(theta0))` if `axis` is 0.
+
+    """
+    theta0, dtheta = np.broadcast_arrays(theta0, dtheta)
+    theta0, dtheta = np.expand_dims(theta0, axis), np.expand_dims(dtheta, axis)
+    shape = list(theta0.shape)
+    shape[axis] = k
+    z = np.empty(shape, dtype=complex)
+    pre = (slice(None),) * axis  # indexes the steps along `axis`
+    z[pre + (slice(0, 1),)] = np.exp(1j * theta0)
+    j = 1
+    while j < k:
+        h = min(j, k - j)
+        z[pre + (slice(j, j + h),)] = z[pre + (slice(0, h),)] * np.exp(1j * dtheta * j)
+        j += h
+    return z
+
+
+def _at(v, idx):
+    """Index a time-varying parameter, leaving scalars untouched."""
+    return v[idx] if np.ndim(v) else v
+
+
+def block_sizes(
+    n, m, max_mem, nb=None, min_mb=1024, itemsize=8, osc="sin", control=False
+):
+    """Chooses block sizes for chunked synthesis.
+
+    Each block requires about four `(nb, mb)` temporaries (phases, sinusoids,
+    envelope, and their product) with the "sin" backend, and the equivalent of about
+    eight with the "phasor" backend, whose sinusoids and envelope phasors are
+    complex. Interpolating a control-rate envelope (see `control_envelope`) takes
+    about three more, always in double precision. The block sizes are chosen such
+    that these fit within `max_mem`. Sinusoids are only split into blocks if keeping
+    all of them would make the blocks of samples shorter than `min_mb`.
+
+    Args:
+        n (int): Number of sinusoids.
+        m (int): Number of samples.
+        max_mem (int): Memory ceiling in bytes.
+        nb (:obj:`int`, optional): Number of sinusoids per block.
+        min_mb (:obj:`int`, optional): Preferred minimum number of samples per block.
+        itemsize (:obj:`int`, optional): Bytes per real value in the temporaries.
+        osc (:obj:`str`, optional): Oscillator backend, either "sin" or "phasor".
+        control (:obj:`bool`, optional): Whether the envelope is interpolated from
+            a control rate.
+
+    Returns:
+        nb (int): Number of sinusoids per block.
+        mb (int): Number of samples per block.
+
+    """
+    cost = (4 if osc == "sin" else 8) * itemsize + (24 if control else 0)
+    if nb is None:
+        nb = min(n, max(1, max_mem // (cost * min(min_mb, m))))
+    nb = min(nb, n)
+    mb = min(m, max_mem // (cost * nb))
+    assert mb >= 1, f"max_mem={max_mem} is too small for blocks of {nb} sinusoids"
+    return nb, mb
+
+
+def ripple_stream(
+    dur,
+    n,
+    omega,
+    w,
+    delta,
+    phi,
+    f0,
+    fm1,
+    l=70,
+    block=1024,
+    peak=None,
+    osc="sin",
+    rng=None,
+    dtype="float64",
+    control_rate=None,
+    phon=None,
+):
+    """Synthesizes a ripple sound one block at a time.
+
+    This produces the same sound as `ripple_sound`, but yields it in blocks so that
+    playback can begin as soon as the first block is ready. The phase of each
+    sinusoid and the cumulative ripple drift are carried over from one block to the
+    next, so the blocks join without discontinuities.
+
+    Because the peak amplitude of the whole sound isn't known in advance, the blocks
+    are scaled by `peak` instead of the actual peak. By default this is the largest
+    value the sum of sinusoids could possibly take, which guarantees no clipping but
+    makes the sound a little quieter than the output of `ripple_sound`. Apart from
+    this constant gain, the two are identical given the same random seed.
+
+    Args:
+        dur (float): Duration of sound in s.
+        n (int): Number of sinusoids.
+        omega (:obj:`float` or `array`-like): Ripple density in Hz. Must be a single
+            value or an array with length `duration * sr`.
+        w (:obj:`float` or `array`-like): Ripple drift in Hz. Must be a single
+            value or an array with length `duration * sr`.
+        delta (:obj:`float` or `array`-like): Normalized ripple depth. Must be a single
+            value or an array with length `duration * sr`. Value(s) must be in
+            the range [0, 1].
+        phi (float): Ripple starting phase in radians.
+        f0 (float): Frequency of the lowest sinusoid in Hz.
+        fm1 (float): Frequency of the highest sinusoid in Hz.
+        l (:obj:`float`, optional): Level in dB of the sound, assuming a pure tone with
+            peak amplitude `a0` is 0 dB SPL.
+        block (:obj:`int`, optional): Number of samples per block.
+        peak (:obj:`float`, optional): Value used to normalize the unscaled sum of
+            sinusoids.
+        osc (:obj:`str`, optional): Oscillator backend, either "sin" or "phasor".
+        rng (:obj:`np.random.Generator`, optional): Source of the random starting
+            phases of the sinusoids. Defaults to the global `np.random` state.
+        dtype (:obj:`str`, optional): Sample type of the blocks; one of "float64",
+            "float32", or "int16".
+        control_rate (:obj:`float`, optional): Evaluate the envelope of sounds with
+            time-varying parameters at this rate in Hz (see `ripple_sound`).
+        phon (:obj:`float`, optional): Make the sinusoids equally loud (see
+            `ripple_sound`). If given, `l` and `peak` are ignored.
+
+    Yields:
+        y (np.array): The next block of the waveform. All blocks have `block`
+            samples except possibly the last one.
+
+    """
+    m = int(dur * sr)  # total number of samples
+    dt = dur / (m - 1)  # sample spacing of the time grid used by `ripple_sound`
+    i = np.arange(n)
+    f = f0 * (fm1 / f0) ** (i / (n - 1))
+    theta = 2 * np.pi * (np.random if rng is None else rng).random(n)
+    x = np.log2(f / f0)
+    omega = np.asarray(omega, dtype=float)
+    delta = np.asarray(delta, dtype=float)
+    if phon is not None:
+        g = gains(f, phon) / np.sqrt(n)
+        gain = 1
+    else:
+        g = 1 / np.sqrt(f)
+        if peak is None:
+            peak = ((1 + np.max(delta)) * g).sum()
+        gain = a0 * 10 ** (l / 20) / peak
+    ftype = working_dtype(dtype)
+    drift = 0.0  # cumulative ripple drift up to the start of the block
+    if control_rate is not None and any(np.ndim(v) for v in (omega, w, delta)):
+        # the envelope of each block is evaluated from the control points spanning it
+        wprime = np.cumsum(w) / sr if hasattr(w, "__iter__") else w * np.arange(m) * dt
+        ctl = (m, control_rate, wprime, omega, delta, phi)
+    else:
+        ctl = None
+
+    for k in range(0, m, block):
+        q = slice(k, k + block)
+        mb = min(block, m - k)
+        t = np.arange(mb) * dt
+        if hasattr(w, "__iter__"):
+            wprime = drift + np.cumsum(w[q]) / sr
+            drift = wprime[-1]
+        else:
+            wprime = drift + w * t
+            drift += w * mb * dt
+        ab = _envelope_at(ctl, k, mb, x)
+        args = (_at(omega, q), _at(delta, q), phi, f, x, theta, osc, ftype, ab)
+        _, y = _ripple_block(t, wprime, *args, g)
+        theta = (theta + 2 * np.pi * f * mb * dt) % (2 * np.pi)
+        yield as_dtype(gain * y, dtype)
+
+
+def play_stream(blocks, block=1024):
+    """Plays a sound as it is being synthesized.
+
+    Blocks are pulled from `blocks` inside the callback of an `sd.OutputStream`, so
+    each one must be synthesized faster than it takes to play. Reduce the number of
+    sinusoids or increase the block size if playback stutters.
+
+    Args:
+        blocks (iterable): Blocks of the waveform, such as those from `ripple_stream`.
+            Each must contain exactly `block` samples except the last one. Integer
+            blocks are assumed to be 16-bit PCM and are scaled to full scale.
+        block (:obj:`int`, optional): Number of samples per block.
+
+    """
+    from threading import Event
+
+    import sounddevice as sd
+
+    blocks = iter(blocks)
+    finished = Event()
+
+    def callback(outdata, frames, time, status):
+        y = next(blocks, np.zeros(0))
+        if y.dtype.kind in "iu":
+            y = y / 32767
+        outdata[: len(y), 0] = y
+        outdata[len(y) :] = 0
+        if len(y) < frames:
+            raise sd.CallbackStop
+
+    stream = sd.OutputStream(
+        sr, block, channels=1, callback=callback, finished_callback=finished.set
+    )
+    with stream:
+        finished.wait()
+
+
+def osc_accuracy(dur=1, n=1000, seed=0, **kwargs):
+    """Compares the "phasor" oscillator backend against the exact "sin" one.
+
+    Synthesizes the same static, moving, and dynamic ripple sounds with both backends
+    and prints how long each took and how far apart the results are.
+
+    Args:
+        dur (:obj:`float`, optional): Duration of sounds in s.
+        n (:obj:`int`, optional): Number of sinusoids.
+        seed (:obj:`int`, optional): Seed for the random-number generator.
+        **kwargs: Passed to `ripple_sound`, e.g., `max_mem`.
+
+    Returns:
+        report (list): One dictionary per sound containing the timings and the
+            maximum absolute error in the waveform relative to its peak.
+
+    """
+    from time import perf_counter
+
+    rng = np.random.RandomState(seed)
+    sounds = {
+        "static": (1, 0, 0.9),
+        "moving": (1, 8, 0.9),
+        "dynamic": (smooth_walk([1] * 5 + [1.5] * 5, dur), 8, rng.random_sample(10)),
+    }
+    report = []
+    for name, (omega, w, delta) in sounds.items():
+        if np.ndim(delta):
+            delta = smooth_walk(delta, dur)
+        results = {}
+        for osc in ("sin", "phasor"):
+            np.random.seed(seed)
+            t0 = perf_counter()
+            y, _ = ripple_sound(
+                dur, n, omega, w, delta, 0, 250, 8000, osc=osc, **kwargs
+            )
+            results[osc] = (perf_counter() - t0, y)
+        (t_sin, y_sin), (t_pha, y_pha) = results.values()
+        row = {
+            "sound": name,
+            "sin_time": t_sin,
+            "phasor_time": t_pha,
+            "waveform_error": np.abs(y_sin - y_pha).max() / np.abs(y_sin).max(),
+        }
+        print(
+            f"{name}: sin took {t_sin:.2f} s, phasor took {t_pha:.2f} s "
+            f"({t_sin / t_pha:.1f}x faster), max relative waveform error "
+            f"{row['waveform_error']:.1e}"
+        )
+        report.append(row)
+    return report
+
+
+def render_batch(table, path, dur=1, n=1000, workers=None, cache=None, **kwargs):
+    """Renders a set of ripple sounds to WAV files in parallel.
+
+    Each row of `table` is synthesized by a separate task in a process pool. The
+    random starting phases of the sinusoids come from a generator seeded with the
+    row's own seed, so every sound is reproducible regardless of which process
+    renders it or in which order. A manifest listing each file alongside its
+    parameters is written to `manifest.csv` in `path`.
+
+    Args:
+        table (:obj:`str` or `list`): Either the name of a CSV file or a list of
+            dictionaries. Each row must contain the keys "omega", "w", "delta",
+            "phi", "f0", "fm1", and "seed".
+        path (str): Directory in which to save the WAV files and the manifest.
+        dur (:obj:`float`, optional): Duration of sounds in s.
+        n (:obj:`int`, optional): Number of sinusoids.
+        workers (:obj:`int`, optional): Number of processes. Defaults to the number
+            of CPUs.
+        cache (:obj:`StimulusCache`, optional): If given, sounds are fetched from
+            this cache and only synthesized if they aren't in it already.
+        **kwargs: Passed to `ripple_sound`. Unless given, `max_mem` is set to 64 MB so
+            that the processes don't compete for memory.
+
+    Returns:
+        manifest (list): One dictionary per sound containing its file name and
+            parameters.
+
+    """
+    import csv
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    if isinstance(table, str):
+        with open(table, newline="") as fr:
+            table = list(csv.DictReader(fr))
+    keys = ("omega", "w", "delta", "phi", "f0", "fm1")
+    rows = [{k: float(r[k]) for k in keys} for r in table]
+    for row, r in zip(rows, table):
+        row["seed"] = int(r["seed"])
+    kwargs.setdefault("max_mem", 2 ** 26)
+
+    os.makedirs(path, exist_ok=True)
+    jobs = [
+        (os.path.join(path, f"ripple-{i:05d}.wav"), dur, n, row, cache, kwargs)
+        for i, row in enumerate(rows)
+    ]
+    manifest = []
+    with ProcessPoolExecutor(workers) as executor:
+        for fn, row in zip(executor.map(_render_one, jobs), rows):
+            manifest.append({"file": os.path.basename(fn), "dur": dur, "n": n, **row})
+
+    with open(os.path.join(path, "manifest.csv"), "w", newline="") as fw:
+        writer = csv.DictWriter(fw, list(manifest[0]))
+        writer.writeheader()
+        writer.writerows(manifest)
+    return manifest
+
+
+def _render_one(job):
+    """Renders a single sound for `render_batch`."""
+    fn, dur, n, row, cache, kwargs = job
+    args = [row[k] for k in ("omega", "w", "delta", "phi", "f0", "fm1")]
+    if cache is None:
+        rng = np.random.default_rng(row["seed"])
+        y, _ = ripple_sound(dur, n, *args, rng=rng, **kwargs)
+    else:
+        y = cache(ripple_sound, dur, n, *args, seed=row["seed"], **kwargs)
+    wavfile.write(fn, sr, y if y.dtype == np.int16 else y.astype(np.float32))
+    return fn
+
+
+def smooth_walk(points, dur, control_rate=None):
     """Return a smooth walk.
 
     Args:
         points (:obj:`array`-like): Points to visit. These are spaced evenly and a
-            spline is used to interpolate them.
+            spline is used to interpolate them. Pass a 2-D array to create several
+            walks at once, one per row.
         dur (float): Duration of sound in s.
+        control_rate (:obj:`float`, optional): Evaluate the spline at this rate in Hz
+            and interpolate linearly in between, rather than at every sample.
 
     Returns:
-        y (numpy.array): Values of the random walk.
+        y (numpy.array): Values of the random walk, one per sample.
 
     """
-    f = interp1d(np.linspace(0, dur, len(points)), points, "cubic")
-    return f(np.linspace(0, dur, dur * sr))
+    return Trajectory(points, dur)(sr, control_rate)
+
+
+def pool(a, shape, how="mean"):
+    """Bins a 2-D array down to at most a given shape.
+
+    Args:
+        a (np.array): Array to bin.
+        shape (tuple): Maximum numbers of rows and columns.
+        how (:obj:`str`, optional): Statistic of each bin; "mean", "min", or "max".
 
+    Returns:
+        a (np.array): Binned array.
 
-def plot_env(a, ax, labels=False):
+    """
+    ufunc = {"mean": np.add, "min": np.minimum, "max": np.maximum}[how]
+    for axis, k in enumerate(shape):
+        size = a.shape[axis]
+        if size <= k:
+            continue
+        edges = np.linspace(0, size, k + 1).astype(int)
+        a = ufunc.reduceat(a, edges[:-1], axis=axis)
+        if how == "mean":
+            a = a / np.expand_dims(np.diff(edges), 1 - axis)
+    return a
+
+
+def plot_env(a, ax, labels=False, shape=(250, 500), how="mean"):
     """Plots an envelope onto an axis.
 
+    Envelopes larger than `shape` are binned down before plotting; `pcolormesh` is
+    very slow with, and makes huge files from, a full envelope.
+
     Args:
-        a (np.array): An array with shape (m, n) where m is the total number of samples
-            and n in the number of sinusoids and values representing instantaneous
-            amplitudes.
+        a (np.array): An array with shape (n, m) where n is the number of sinusoids and
+            m is the total number of samples and values representing instantaneous
+            amplitudes, such as the output of `RippleEnvelope.grid`.
         ax (matplotlib.axes._subplots.AxesSubplot): Axis.
         labels (:obj:`bool`, optional): Include labels or not.
+        shape (:obj:`tuple`, optional): Maximum numbers of rows and columns to plot.
+        how (:obj:`str`, optional): How to bin larger envelopes; "mean", "min", or
+            "max".
 
     """
+    a = pool(a, shape, how)
     ax.pcolormesh(a, rasterized=True, vmin=0, vmax=2)
     ax.set_xticks([], [])
     ax.set_yticks([], [])
@@ -114,7 +886,7 @@ def main():
     # default parameter values
     np.random.seed(0)
     dur = 1
-    n = 1000  # reduce this if you want to make figures; otherwise it takes forever!
+    n = 1000
     omega = 1
     w = 8
     delta = 0.9
@@ -126,54 +898,75 @@ def main():
     # filenames of figures
     fn = "../../assets/images/%s-ripples.svg"
 
-    # static ripple sounds
-    print("making static ripple sounds")
-    _, axes = plt.subplots(1, 3, constrained_layout=True, sharex="all", sharey="all")
-    for i, ax in enumerate(axes):
-        _omega = 1.5 if i == 1 else omega
-        _w = 0
-        _delta = 0.5 if i == 2 else delta
-        print(f"sound with omega={_omega:.2f}, w={_w:.2f}, and delta={_delta:.2f}")
-        y, a = ripple_sound(dur, n, _omega, _w, _delta, *args)
-        print("playing sound")
-        sd.play(y, sr, blocking=True)
-        print("plotting")
-        plot_env(a, ax, ax == axes[0])
-    print("saving a figure")
-    plt.savefig(fn % "static", bbox_inches=0, transparent=True)
-
-    # moving ripple sounds
-    print("making moving ripple sounds")
-    _, axes = plt.subplots(1, 3, constrained_layout=True, sharex="all", sharey="all")
-    _ws = [4, 8, -4]
-    for i, ax in enumerate(axes):
-        _omega = omega
-        _w = _ws[i]
-        _delta = delta
-        print(f"sound with omega={_omega:.2f}, w={_w:.2f}, and delta={_delta:.2f}")
-        y, a = ripple_sound(dur, n, _omega, _w, _delta, *args)
-        print("playing sound")
-        sd.play(y, sr, blocking=True)
-        print("plotting")
-        plot_env(a, ax, ax == axes[0])
-    print("making a figure")
-    plt.savefig(fn % "moving", bbox_inches=0, transparent=True)
-
-    # dynamic moving ripple sounds
-    print("making dynamic static ripple sounds")
-    _, axes = plt.subplots(1, 3, constrained_layout=True, sharex="all", sharey="all")
-    for i, ax in enumerate(axes):
-        _delta = smooth_walk(np.random.random(10), dur) if i == 0 else delta
-        _omega = smooth_walk([1] * 5 + [1.5] * 5, dur) if i == 1 else omega
-        _w = smooth_walk([-8, 0, 4, 8], dur) if i == 2 else w
-        print(f"{[_delta, _omega, _w][i].shape}")
-        y, a = ripple_sound(dur, n, _omega, _w, _delta, *args)
-        print("playing sound")
-        sd.play(y, sr, blocking=True)
-        print("plotting")
-        plot_env(a, ax, ax == axes[0])
-    print("making a figure")
-    plt.savefig(fn % "dynamic", bbox_inches=0, transparent=True)
+    # each sound draws from its own generator, so it is only synthesized once
+    cache = StimulusCache()
+
+    def synthesize(omega, w, delta):
+        s = np.random.randint(2 ** 31)
+        y = cache(
+            ripple_sound, dur, n, omega, w, delta, *args, seed=s, max_mem=2 ** 26
+        )
+        return y, RippleEnvelope(dur, n, omega, w, delta, *args)
+
+    # one stream is kept open for all the sounds
+    with Sequencer(sr) as seq:
+        # static ripple sounds
+        print("making static ripple sounds")
+        _, axes = plt.subplots(
+            1, 3, constrained_layout=True, sharex="all", sharey="all"
+        )
+        for i, ax in enumerate(axes):
+            _omega = 1.5 if i == 1 else omega
+            _w = 0
+            _delta = 0.5 if i == 2 else delta
+            print(f"sound with omega={_omega:.2f}, w={_w:.2f}, and delta={_delta:.2f}")
+            y, a = synthesize(_omega, _w, _delta)
+            print("playing sound")
+            seq.schedule(y)
+            seq.wait()
+            print("plotting")
+            plot_env(a.grid(), ax, ax == axes[0])
+        print("saving a figure")
+        plt.savefig(fn % "static", bbox_inches=0, transparent=True)
+
+        # moving ripple sounds
+        print("making moving ripple sounds")
+        _, axes = plt.subplots(
+            1, 3, constrained_layout=True, sharex="all", sharey="all"
+        )
+        _ws = [4, 8, -4]
+        for i, ax in enumerate(axes):
+            _omega = omega
+            _w = _ws[i]
+            _delta = delta
+            print(f"sound with omega={_omega:.2f}, w={_w:.2f}, and delta={_delta:.2f}")
+            y, a = synthesize(_omega, _w, _delta)
+            print("playing sound")
+            seq.schedule(y)
+            seq.wait()
+            print("plotting")
+            plot_env(a.grid(), ax, ax == axes[0])
+        print("making a figure")
+        plt.savefig(fn % "moving", bbox_inches=0, transparent=True)
+
+        # dynamic moving ripple sounds
+        print("making dynamic static ripple sounds")
+        _, axes = plt.subplots(
+            1, 3, constrained_layout=True, sharex="all", sharey="all"
+        )
+        for i, ax in enumerate(axes):
+            _delta = smooth_walk(np.random.random(10), dur) if i == 0 else delta
+            _omega = smooth_walk([1] * 5 + [1.5] * 5, dur) if i == 1 else omega
+            _w = smooth_walk([-8, 0, 4, 8], dur) if i == 2 else w
+            print(f"{[_delta, _omega, _w][i].shape}")
+            y, a = synthesize(_omega, _w, _delta)
+            print("playing sound")
+            seq.schedule(y)
+            seq.wait()
+            print("plotting")
+            plot_env(a.grid(), ax, ax == axes[0])
+        print("making a figure")
+        plt.savefig(fn % "dynamic", bbox_inches=0, transparent=True)
 
 
 if __name__ == "__main__":
@@ -2,13 +2,74 @@
 using signal detection theory.
 
 """
+import queue
+import threading
+
 import numpy as np
-from scipy.stats import norm
 import prettytable as pt
-import sounddevice as sd
 
+from pcm import as_dtype
+from playback import Sequencer
+from sdt import bootstrap, counts, posterior, sdt_yn
+
+
+t = np.arange(0, 0.1, 1 / 44100)
+tone = 1e-5 * 10 ** (50 / 20) * np.sin(2 * np.pi * 1000 * t + 0)  # same every trial
+
+
+def stimulus(signal, dtype="float32", rng=None):
+    """Generates the stimulus for a trial.
+
+    Args:
+        signal (bool): Should the stimulus contain a tone?
+        dtype (:obj:`str`, optional): Sample type of the stimulus; one of "float64",
+            "float32", or "int16".
+        rng (:obj:`np.random.Generator`, optional): Source of the noise. Defaults to
+            the global `np.random` state.
+
+    Returns:
+        stim (np.array): Noise, plus a tone if `signal` is `True`.
+
+    """
+    rng = np.random if rng is None else rng
+    noise = rng.normal(size=len(tone)) * tone.std() / np.sqrt(2)
+    return as_dtype(noise + tone if signal else noise, dtype)
+
+
+def prerender(X, dtype="float32", ahead=16, rng=None):
+    """Renders the stimuli for a schedule of trials in a background thread.
+
+    At most `ahead` stimuli are held in memory at once, so arbitrarily long sessions
+    can be prepared without their memory use growing. The thread keeps this many
+    stimuli ready, so the next one is always available as soon as it is needed.
 
-def trial(signal, n=None):
+    Args:
+        X (iterable): Whether each trial should contain a tone, in order.
+        dtype (:obj:`str`, optional): Sample type of the stimuli.
+        ahead (:obj:`int`, optional): Number of stimuli to render in advance.
+        rng (:obj:`np.random.Generator`, optional): Source of the noise.
+
+    Yields:
+        stim (np.array): The stimulus for each trial in turn.
+
+    """
+    buffers = queue.Queue(ahead)
+    done = object()
+
+    def render():
+        for x in X:
+            buffers.put(stimulus(x, dtype, rng))
+        buffers.put(done)
+
+    threading.Thread(target=render, daemon=True).start()
+    while True:
+        stim = buffers.get()
+        if stim is done:
+            return
+        yield stim
+
+
+def trial(signal, n=None, dtype="float32", seq=None, stim=None):
     """Performs a trial in the experiment.
 
     Args:
@@ -16,6 +77,12 @@ def trial(signal, n=None):
         n (:obj:`bool`, optional): Trial number. If omitted, a "practice" trial is
             performed which will allow the observer an opportunity to change the volume
             settings on their computer.
+        dtype (:obj:`str`, optional): Sample type of the stimulus passed to
+            `sounddevice`; one of "float64", "float32", or "int16".
+        seq (:obj:`Sequencer`, optional): If given, the stimulus is played through
+            this sequencer's open stream rather than a new one.
+        stim (:obj:`np.array`, optional): Stimulus rendered in advance, for example
+            by `prerender`. If omitted, it is generated here.
 
     Returns:
         rsp (bool): On practice trials, this indicates whether the real experiment
@@ -23,10 +90,14 @@ def trial(signal, n=None):
             "yes".
 
     """
-    t = np.arange(0, 0.1, 1 / 44100)
-    tone = 1e-5 * 10 ** (50 / 20) * np.sin(2 * np.pi * 1000 * t + 0)
-    noise = np.random.normal(size=len(t)) * tone.std() / np.sqrt(2)
-    sd.play(noise + tone if signal and isinstance(n, int) else noise, 44100)
+    if stim is None:
+        stim = stimulus(signal and isinstance(n, int), dtype)
+    if seq is None:
+        import sounddevice as sd
+
+        sd.play(stim, 44100)
+    else:
+        seq.schedule(stim)
     responses = {"n": False, "y": True}
     if isinstance(n, int):
         instr = f"Trial {n}: Did you hear a tone? ([y] or [n])?"
@@ -44,28 +115,15 @@ def experiment():
     """Performs a series of trials.
 
     """
-    adj = True
-    while adj:
-        adj = trial(False)
     X = [False, True] * 20
     np.random.shuffle(X)
-    Y = [trial(*p[::-1]) for p in enumerate(X)]
-    c = sum([1 for x, y in zip(X, Y) if x == 0 and y == 0])
-    f = sum([1 for x, y in zip(X, Y) if x == 0 and y == 1])
-    m = sum([1 for x, y in zip(X, Y) if x == 1 and y == 0])
-    h = sum([1 for x, y in zip(X, Y) if x == 1 and y == 1])
-    return c, f, m, h
-
-
-def sdt_yn(c, f, m, h):
-    """Calcualte SDT statistics.
-
-    """
-    n = f + c
-    s = m + h
-    sens = norm.ppf(h / s) - norm.ppf(f / n)
-    crit = -0.5 * (norm.ppf(h / s) + norm.ppf(f / n))
-    return sens, crit
+    stims = prerender(X, rng=np.random.default_rng())
+    with Sequencer(44100) as seq:
+        adj = True
+        while adj:
+            adj = trial(False, seq=seq)
+        Y = [trial(x, n, seq=seq, stim=s) for n, (x, s) in enumerate(zip(X, stims))]
+    return tuple(int(v) for v in counts(X, Y))
 
 
 if __name__ == "__main__":
@@ -97,14 +155,21 @@ detection theory (SDT)."""
     table.add_row(["y = 1", f, h])
     print("Here is your contingency table:")
     print(table)
+    correction = None
     if any(x == 0 for x in (c, f, m, h)):
         print(
             """\
-Unfortunately, one or more of the cells has a value of 0. SDT statistics can't be
-calculated without applying some form of correction. Exiting now"""
+One or more of the cells has a value of 0, so the log-linear correction will be
+applied."""
         )
-        exit()
+        correction = "loglinear"
     print("Calculating SDT statistics ...")
-    sens, crit = sdt_yn(c, f, m, h)
+    sens, crit = sdt_yn(c, f, m, h, correction)
+    sens_ci, crit_ci = bootstrap(c, f, m, h)
+    sens_cr, crit_cr = posterior(c, f, m, h)
     print("sensitivity (d') = %.2f" % sens)
+    print("  95%% bootstrap CI = [%.2f, %.2f]" % tuple(sens_ci))
+    print("  95%% credible interval = [%.2f, %.2f]" % tuple(sens_cr))
     print("criterion (c) = %.2f" % crit)
+    print("  95%% bootstrap CI = [%.2f, %.2f]" % tuple(crit_ci))
+    print("  95%% credible interval = [%.2f, %.2f]" % tuple(crit_cr))
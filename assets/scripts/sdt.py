@@ -0,0 +1,228 @@
+"""Signal detection theory (SDT) statistics for yes/no experiments.
+
+Every function works on whole batches at once. Counts may be arrays of any (mutually
+broadcastable) shape, such as subjects × conditions, and a stacked array of
+contingency tables with the four cells along its last axis can be unpacked straight
+into them:
+
+    >>> d, c = sdt_yn(*np.moveaxis(tables, -1, 0), correction="loglinear")
+
+Cells are always in the order correct rejections, false alarms, misses, hits, which
+is the order returned by `experiment` in `sdt-yn-experiment.py`.
+
+Uncertainty in the statistics can be quantified with bootstrap confidence intervals
+(`bootstrap`) or Bayesian credible intervals (`posterior`).
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from scipy.special import ndtri
+
+
+corrections = (None, "loglinear", "1/2n")
+
+
+def counts(X, Y):
+    """Counts the cells of the contingency tables of one or more sessions.
+
+    Args:
+        X (:obj:`array`-like): Whether each trial contained a signal, with trials
+            along the last axis.
+        Y (:obj:`array`-like): Whether the observer responded "yes" on each trial,
+            with the same shape as `X`.
+
+    Returns:
+        c (np.array): Correct rejections.
+        f (np.array): False alarms.
+        m (np.array): Misses.
+        h (np.array): Hits.
+
+    """
+    X = np.asarray(X, dtype=bool)
+    Y = np.asarray(Y, dtype=bool)
+    s = X.sum(-1)
+    h = (X & Y).sum(-1)
+    f = Y.sum(-1) - h
+    return X.shape[-1] - s - f, f, s - h, h
+
+
+def rates(c, f, m, h, correction=None):
+    """Calculates hit and false-alarm rates.
+
+    A rate of 0 or 1 makes d' infinite, so one of two standard corrections can be
+    applied. The log-linear correction (Hautus, 1995) adds 0.5 to every cell of every
+    table. The 1/2n correction (Macmillan & Kaplan, 1985) only replaces rates of 0
+    and 1, with 1/2n and 1 - 1/2n, where n is the number of trials of that kind.
+
+    Args:
+        c (:obj:`array`-like): Correct rejections.
+        f (:obj:`array`-like): False alarms.
+        m (:obj:`array`-like): Misses.
+        h (:obj:`array`-like): Hits.
+        correction (:obj:`str`, optional): One of `None`, "loglinear", or "1/2n".
+
+    Returns:
+        hr (np.array): Hit rates.
+        fr (np.array): False-alarm rates.
+
+    """
+    assert correction in corrections, f"{correction} is not one of {corrections}"
+    c, f, m, h = (np.asarray(v, dtype=float) for v in (c, f, m, h))
+    n = c + f
+    s = m + h
+    if correction == "loglinear":
+        return (h + 0.5) / (s + 1), (f + 0.5) / (n + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hr = h / s
+        fr = f / n
+    if correction == "1/2n":
+        hr = np.clip(hr, 0.5 / s, 1 - 0.5 / s)
+        fr = np.clip(fr, 0.5 / n, 1 - 0.5 / n)
+    return hr, fr
+
+
+def sdt_yn(c, f, m, h, correction=None):
+    """Calculates SDT statistics.
+
+    Args:
+        c (:obj:`array`-like): Correct rejections.
+        f (:obj:`array`-like): False alarms.
+        m (:obj:`array`-like): Misses.
+        h (:obj:`array`-like): Hits.
+        correction (:obj:`str`, optional): Correction for rates of 0 and 1; see
+            `rates`. Without one, such tables give infinite or undefined statistics.
+
+    Returns:
+        sens (np.array): Sensitivity (d').
+        crit (np.array): Criterion (c).
+
+    """
+    zh, zf = ndtri(rates(c, f, m, h, correction))
+    with np.errstate(invalid="ignore"):
+        return zh - zf, -0.5 * (zh + zf)
+
+
+def bootstrap(
+    c,
+    f,
+    m,
+    h,
+    n=2000,
+    ci=0.95,
+    correction="loglinear",
+    seed=None,
+    max_mem=2 ** 27,
+    workers=1,
+):
+    """Calculates bootstrap confidence intervals for SDT statistics.
+
+    Trials are resampled with replacement separately for noise and signal trials, so
+    every replicate has the same numbers of each as the original table. Resampling
+    the cells of each row of a table is then a draw from a binomial distribution,
+    so all the replicates of all the tables are drawn in a single call.
+
+    Replicates often contain empty cells even when the original table does not, so
+    a correction should normally be applied.
+
+    Args:
+        c (:obj:`array`-like): Correct rejections.
+        f (:obj:`array`-like): False alarms.
+        m (:obj:`array`-like): Misses.
+        h (:obj:`array`-like): Hits.
+        n (:obj:`int`, optional): Number of bootstrap replicates per table.
+        ci (:obj:`float`, optional): Coverage of the percentile intervals.
+        correction (:obj:`str`, optional): Correction applied to each replicate; see
+            `rates`.
+        seed (:obj:`int`, optional): Random seed. Results depend on the seed and
+            on `max_mem`, but not on `workers`.
+        max_mem (:obj:`int`, optional): Approximate memory cap in bytes. Tables are
+            processed in chunks small enough to fit.
+        workers (:obj:`int`, optional): Number of processes over which to spread the
+            chunks. If `None`, all available cores are used.
+
+    Returns:
+        sens (np.array): Lower and upper limits of the intervals for d', with shape
+            `(2, ...)`.
+        crit (np.array): Lower and upper limits of the intervals for c.
+
+    """
+    return _intervals(
+        "bootstrap", c, f, m, h, n, ci, correction, seed, max_mem, workers
+    )
+
+
+def posterior(
+    c, f, m, h, n=2000, ci=0.95, prior=(1, 1), seed=None, max_mem=2 ** 27, workers=1
+):
+    """Calculates Bayesian credible intervals for SDT statistics.
+
+    The hit and false-alarm rates are given independent beta priors. These are
+    conjugate to the binomial likelihoods of the hits and false alarms, so their
+    posteriors are also beta distributions, which are sampled directly. Samples of
+    the rates are then transformed into samples of the statistics. Empty cells need
+    no correction, because the posterior rates are never exactly 0 or 1.
+
+    Args:
+        c (:obj:`array`-like): Correct rejections.
+        f (:obj:`array`-like): False alarms.
+        m (:obj:`array`-like): Misses.
+        h (:obj:`array`-like): Hits.
+        n (:obj:`int`, optional): Number of posterior samples per table.
+        ci (:obj:`float`, optional): Coverage of the equal-tailed intervals.
+        prior (:obj:`tuple`, optional): Parameters of the beta prior. The default is
+            uniform.
+        seed (:obj:`int`, optional): Random seed.
+        max_mem (:obj:`int`, optional): Approximate memory cap in bytes.
+        workers (:obj:`int`, optional): Number of processes to use.
+
+    Returns:
+        sens (np.array): Lower and upper limits of the intervals for d', with shape
+            `(2, ...)`.
+        crit (np.array): Lower and upper limits of the intervals for c.
+
+    """
+    return _intervals("posterior", c, f, m, h, n, ci, prior, seed, max_mem, workers)
+
+
+def _intervals(method, c, f, m, h, n, ci, opt, seed, max_mem, workers):
+    """Splits a batch of tables into chunks and calculates intervals for each."""
+    cells = np.stack(np.broadcast_arrays(c, f, m, h))
+    assert np.all(cells == np.round(cells)), "counts must be whole numbers"
+    cells = cells.astype(np.int64)
+    shape = cells.shape[1:]
+    cells = cells.reshape(4, -1)
+    k = cells.shape[1]
+
+    # each replicate of each table needs about four floats at a time
+    size = max(1, min(k, max_mem // (32 * n)))
+    starts = range(0, k, size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    jobs = [
+        (method, cells[:, i : i + size], n, ci, opt, ss) for i, ss in zip(starts, seeds)
+    ]
+    if workers == 1 or len(jobs) == 1:
+        results = list(map(_chunk, jobs))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_chunk, jobs))
+    sens, crit = (np.concatenate(v, axis=1).reshape(2, *shape) for v in zip(*results))
+    return sens, crit
+
+
+def _chunk(job):
+    """Calculates intervals for one chunk of tables."""
+    method, (c, f, m, h), n, ci, opt, ss = job
+    rng = np.random.default_rng(ss)
+    if method == "bootstrap":
+        fb = rng.binomial(c + f, f / np.maximum(c + f, 1), (n, len(c)))
+        hb = rng.binomial(m + h, h / np.maximum(m + h, 1), (n, len(c)))
+        sens, crit = sdt_yn(c + f - fb, fb, m + h - hb, hb, opt)
+    else:
+        a, b = opt
+        zh = ndtri(rng.beta(h + a, m + b, (n, len(c))))
+        zf = ndtri(rng.beta(f + a, c + b, (n, len(c))))
+        sens, crit = zh - zf, -0.5 * (zh + zf)
+    q = 50 * (1 - ci), 50 * (1 + ci)
+    return np.percentile(sens, q, axis=0), np.percentile(crit, q, axis=0)
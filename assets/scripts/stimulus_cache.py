@@ -0,0 +1,154 @@
+"""On-disk cache for synthesized stimuli.
+
+Waveforms are stored as `.npy` files named after a hash of the function that made
+them, its arguments, and the random seed, so identical stimuli are only ever
+synthesized once. Cached waveforms are loaded as read-only memory maps.
+
+"""
+import hashlib
+import inspect
+import os
+
+import numpy as np
+
+
+class StimulusCache:
+    """A content-addressed cache of waveforms with a size cap.
+
+    When the total size of the cache exceeds `max_bytes`, the least recently used
+    files are deleted until it fits again. Each hit touches the modification time of
+    the file, which is used to decide which files were used least recently.
+
+    Args:
+        path (:obj:`str`, optional): Directory in which to store the waveforms.
+        max_bytes (:obj:`int`, optional): Size cap of the cache in bytes.
+        dtype (:obj:`str`, optional): Floating-point waveforms are cast to this type
+            before they are stored. Integer waveforms are stored as they are.
+
+    """
+
+    def __init__(self, path="~/.cache/stimuli", max_bytes=2 ** 30, dtype="float32"):
+
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        os.makedirs(self.path, exist_ok=True)
+
+    def __call__(self, func, *args, seed=None, **kwargs):
+        """Returns a cached waveform, synthesizing and storing it if necessary.
+
+        Args:
+            func (callable): Synthesis function. If it returns a tuple, only the first
+                element (the waveform) is cached.
+            *args: Passed to `func`.
+            seed (:obj:`int`, optional): If given, `func` is passed a generator
+                seeded with this value as its `rng` keyword argument. Functions that
+                draw random numbers must be given a seed, otherwise the cached
+                waveform would be reused for what should be a different sound.
+            **kwargs: Passed to `func`.
+
+        Returns:
+            y (np.array): The waveform, as a read-only memory map of the cached file.
+                Copy it before modifying it in place.
+
+        """
+        fn = os.path.join(self.path, self.key(func, args, kwargs, seed) + ".npy")
+        try:
+            y = np.load(fn, mmap_mode="r")
+            os.utime(fn)
+            return y
+        except (FileNotFoundError, ValueError):
+            pass
+
+        if seed is not None:
+            kwargs["rng"] = np.random.default_rng(seed)
+        y = func(*args, **kwargs)
+        if isinstance(y, tuple):
+            y = y[0]
+        y = np.asarray(y)
+        if y.dtype.kind == "f":
+            y = y.astype(self.dtype)
+
+        # write to a temporary file first so that other processes never see a
+        # partially written waveform
+        tmp = f"{fn}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fw:
+            np.save(fw, y)
+        os.replace(tmp, fn)
+        self.evict()
+
+        # return the same read-only memory map as a hit would, so that callers behave
+        # the same whether or not the waveform was cached already
+        try:
+            return np.load(fn, mmap_mode="r")
+        except FileNotFoundError:  # evicted straight away; larger than the cache
+            y.flags.writeable = False
+            return y
+
+    @staticmethod
+    def key(func, args, kwargs, seed):
+        """Hashes a synthesis function, its arguments, and the seed.
+
+        The source code of the module defining the function is part of the hash, so
+        editing the module invalidates everything it has cached.
+
+        Args:
+            func (callable): Synthesis function.
+            args (tuple): Positional arguments.
+            kwargs (dict): Keyword arguments.
+            seed (int): Random seed or `None`.
+
+        Returns:
+            key (str): Hexadecimal digest.
+
+        """
+        h = hashlib.sha256()
+        try:
+            h.update(inspect.getsource(inspect.getmodule(func)).encode())
+        except (OSError, TypeError):
+            pass
+        h.update(func.__qualname__.encode())
+        for v in (*args, *sorted(kwargs.items()), ("seed", seed)):
+            _update(h, v)
+        return h.hexdigest()
+
+    def evict(self):
+        """Deletes least recently used waveforms until the cache fits its size cap.
+
+        """
+        entries = []
+        for f in os.listdir(self.path):
+            if f.endswith(".npy"):
+                st = os.stat(os.path.join(self.path, f))
+                entries.append((st.st_mtime, st.st_size, f))
+        total = sum(e[1] for e in entries)
+        for _, size, f in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, f))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Deletes all cached waveforms.
+
+        """
+        for f in os.listdir(self.path):
+            if f.endswith(".npy"):
+                os.remove(os.path.join(self.path, f))
+
+
+def _update(h, v):
+    """Feed a (possibly nested) argument into a hash."""
+    if isinstance(v, (tuple, list)):
+        h.update(f"{type(v).__name__}{len(v)}".encode())
+        for u in v:
+            _update(h, u)
+    elif isinstance(v, np.ndarray):
+        h.update(f"ndarray{v.dtype.str}{v.shape}".encode())
+        h.update(np.ascontiguousarray(v).tobytes())
+    else:
+        h.update(repr(v).encode())
+    h.update(b"\0")
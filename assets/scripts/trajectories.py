@@ -0,0 +1,79 @@
+"""Smooth parameter trajectories for time-varying stimuli.
+
+"""
+import numpy as np
+
+from scipy.interpolate import CubicSpline
+
+
+sr = 44100  # sample rate
+
+
+class Trajectory:
+    """One or more smooth trajectories through evenly spaced points.
+
+    A cubic spline is fitted through the points once, when the object is created, and
+    can then be evaluated over sample grids as often as needed. Passing a 2-D array of
+    points creates a batch of trajectories that are fitted and evaluated together.
+
+    The spline has not-a-knot end conditions, so trajectories are identical to those
+    from `scipy.interpolate.interp1d` with `kind="cubic"`.
+
+    Args:
+        points (:obj:`array`-like): Points to visit, with shape `(k,)` or, for a batch
+            of `b` trajectories, `(b, k)`.
+        dur (float): Duration of the trajectories in s.
+
+    """
+
+    def __init__(self, points, dur):
+
+        points = np.asarray(points, dtype=float)
+        self.dur = dur
+        x = np.linspace(0, dur, points.shape[-1])
+        self.spline = CubicSpline(x, points, axis=-1)
+
+    def __call__(self, sr=sr, control_rate=None):
+        """Evaluates the trajectories at every sample.
+
+        Args:
+            sr (:obj:`int`, optional): Sample rate in Hz. There are `int(dur * sr)`
+                samples, spanning the whole duration, which matches the time grid of
+                the ripple-sound functions.
+            control_rate (:obj:`float`, optional): If given, the spline is only
+                evaluated at this rate in Hz, and the samples in between are filled in
+                by linear interpolation. This is much faster and perfectly adequate
+                for slowly varying parameters.
+
+        Returns:
+            y (np.array): Trajectories with shape `(m,)` or `(b, m)`.
+
+        """
+        m = int(self.dur * sr)
+        if control_rate is None:
+            return self.spline(np.linspace(0, self.dur, m))
+        mc = max(2, int(np.ceil(self.dur * control_rate)) + 1)
+        yc = self.spline(np.linspace(0, self.dur, mc))
+        return upsample(yc, m)
+
+
+def upsample(yc, m):
+    """Linearly interpolates evenly spaced values to a finer grid.
+
+    Both grids span the same interval, so the first and last values are kept.
+
+    Args:
+        yc (np.array): Values with shape `(mc,)` or `(b, mc)`.
+        m (int): Number of values after upsampling.
+
+    Returns:
+        y (np.array): Values with shape `(m,)` or `(b, m)`.
+
+    """
+    mc = yc.shape[-1]
+    pos = np.linspace(0, mc - 1, m)
+    if yc.ndim == 1:
+        return np.interp(pos, np.arange(mc), yc)
+    i = np.minimum(pos.astype(int), mc - 2)
+    frac = pos - i
+    return yc[..., i] * (1 - frac) + yc[..., i + 1] * frac